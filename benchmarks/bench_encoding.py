@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'encodage : nombre de modules et temps de rendu avant/après
+la sélection du niveau de correction d'erreur et la segmentation optimale.
+
+Usage : python benchmarks/bench_encoding.py [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_H
+from qrcode.image.styledpil import StyledPilImage
+
+import main
+
+PAYLOADS = {
+    "url courte": "https://example.com",
+    "url longue": "https://shop.example.com/products/summer-collection/item?id=1234567890&utm_source=newsletter&utm_medium=email&utm_campaign=2024-07",
+    "numérique": "4006381333931" * 8,
+    "alphanumérique": "HTTPS://EXAMPLE.COM/TRACK/ABCDEF0123456789/ORDER-42",
+    "wifi": "WIFI:T:WPA;S:Reseau-Bureau;P:motdepasse-tres-long-2024;;",
+    "vcard": "BEGIN:VCARD\nVERSION:3.0\nN:Dupont;Jean\nTEL:+33612345678\nEMAIL:jean.dupont@example.com\nEND:VCARD",
+}
+
+
+def qr_before(data: str) -> qrcode.QRCode:
+    """Comportement historique : H partout, segmentation par défaut de qrcode."""
+    qr = qrcode.QRCode(version=1, error_correction=ERROR_CORRECT_H, box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def qr_after(data: str) -> qrcode.QRCode:
+    return main.make_qr(data, "auto", has_logo=False)
+
+
+def time_render(build, data: str, repeat: int) -> float:
+    """Temps moyen (ms) pour encoder puis dessiner le QR code."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        main.optimal_segments.cache_clear()
+        qr = build(data)
+        qr.make_image(image_factory=StyledPilImage, module_drawer=main.MODULE_STYLES["rounded"])
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'payload':<16} {'version':>9} {'modules':>13} {'rendu (ms)':>17}")
+    print("-" * 58)
+    for name, data in PAYLOADS.items():
+        before, after = qr_before(data), qr_after(data)
+        t_before = time_render(qr_before, data, args.repeat)
+        t_after = time_render(qr_after, data, args.repeat)
+        print(
+            f"{name:<16} {before.version:>4}→{after.version:<4} "
+            f"{before.modules_count ** 2:>6}→{after.modules_count ** 2:<6} "
+            f"{t_before:>8.1f}→{t_after:<8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main_bench()
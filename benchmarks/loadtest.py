@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Générateur de charge asyncio pour l'API QR Code.
+
+Envoie un trafic mixte (GET /generate-qr en cache et hors cache, POST /generate-qr
+avec logo uploadé ou logo_url, scans /redirect) à concurrence croissante, et
+affiche p50/p95/p99, le débit et les erreurs par code HTTP pour chaque palier.
+Le trafic est réparti sur --tenants locataires (x-rapidapi-user) aux offres
+--plan (x-rapidapi-subscription), pour exercer l'ordonnancement équitable et
+les limites par locataire. Un petit serveur HTTP local sert l'image des
+logo_url avec une latence configurable.
+
+Usage :
+    python benchmarks/loadtest.py                          # application ASGI en processus
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --concurrency 1,4,16,64
+    python benchmarks/loadtest.py --logo-latency-ms 200 --duration 20 --json curve.json
+    python benchmarks/loadtest.py --tenants 50 --plan BASIC,PRO,MEGA
+
+En processus, le générateur partage la boucle d'événements de l'application :
+pour mesurer le point de saturation d'un worker, préférer --url avec uvicorn.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+CACHED_DATA = [f"https://example.com/promo/{i}" for i in range(10)]
+DEFAULT_MIX = "cached=50,uncached=20,upload=10,logo_url=5,redirect=15"
+
+
+def tenant_headers(count: int, plans: str) -> list:
+    """En-têtes RapidAPI de count locataires, offres attribuées à tour de rôle."""
+    plan_names = [plan.strip().upper() for plan in plans.split(",") if plan.strip()]
+    return [
+        {
+            "x-rapidapi-host": "loadtest",
+            "x-rapidapi-user": f"loadtest-{i}",
+            "x-rapidapi-subscription": plan_names[i % len(plan_names)],
+        }
+        for i in range(count)
+    ]
+
+
+def make_logo_bytes(size: int = 256) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), (30, 120, 200)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class LogoServer:
+    """Serveur HTTP minimal servant un PNG après une latence configurable."""
+
+    def __init__(self, latency_ms: float, logo: bytes):
+        self.latency = latency_ms / 1000
+        self.logo = logo
+        self.server = None
+        self.url = ""
+
+    async def handle(self, reader, writer):
+        try:
+            # Lire jusqu'à la fin des en-têtes ; le corps des GET est vide
+            await reader.readuntil(b"\r\n\r\n")
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n"
+                + f"Content-Length: {len(self.logo)}\r\nConnection: close\r\n\r\n".encode()
+                + self.logo
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/logo.png"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class Scenarios:
+    """Requêtes du mélange de trafic, choisies aléatoirement selon leur poids."""
+
+    def __init__(self, client: httpx.AsyncClient, tenants: list, logo: bytes, logo_url: str, redirect_ids: list):
+        self.client = client
+        self.tenants = tenants
+        self.logo = logo
+        self.logo_source = logo_url
+        self.redirect_ids = redirect_ids
+
+    def headers(self) -> dict:
+        return random.choice(self.tenants)
+
+    async def cached(self):
+        return await self.client.get("/generate-qr", params={"data": random.choice(CACHED_DATA)}, headers=self.headers())
+
+    async def uncached(self):
+        return await self.client.get("/generate-qr", params={"data": f"https://example.com/{uuid.uuid4()}"}, headers=self.headers())
+
+    async def upload(self):
+        return await self.client.post(
+            "/generate-qr",
+            data={"data": f"https://example.com/{uuid.uuid4()}"},
+            files={"logo": ("logo.png", self.logo, "image/png")},
+            headers=self.headers(),
+        )
+
+    async def logo_url(self):
+        return await self.client.post(
+            "/generate-qr",
+            data={"data": f"https://example.com/{uuid.uuid4()}", "logo_url": self.logo_source},
+            headers=self.headers(),
+        )
+
+    async def redirect(self):
+        return await self.client.get(f"/redirect/{random.choice(self.redirect_ids)}", headers=self.headers())
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def percentile(samples: list, p: int) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+async def create_redirect_ids(client: httpx.AsyncClient, tenants: list, count: int) -> list:
+    """Crée des QR dynamiques et récupère leur identifiant (en-tête X-QR-ID)."""
+    ids = []
+    for i in range(count):
+        resp = await client.post(
+            "/create-dynamic-qr",
+            data={"target_url": f"https://example.com/landing/{i}", "size": 200},
+            headers=tenants[i % len(tenants)],
+        )
+        resp.raise_for_status()
+        ids.append(resp.headers["x-qr-id"])
+    return ids
+
+
+async def run_step(scenarios: Scenarios, weights: dict, concurrency: int, duration: float) -> dict:
+    names = list(weights)
+    scenario_weights = list(weights.values())
+    latencies = defaultdict(list)
+    errors = defaultdict(lambda: defaultdict(int))
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            name = random.choices(names, scenario_weights)[0]
+            start = time.perf_counter()
+            try:
+                resp = await getattr(scenarios, name)()
+                status = str(resp.status_code)
+            except httpx.HTTPError as exc:
+                # Erreurs de transport : classées par type d'exception
+                status = type(exc).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            if status.isdigit() and int(status) < 400:
+                latencies[name].append(elapsed)
+            else:
+                errors[name][status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    by_status = defaultdict(int)
+    for counts in errors.values():
+        for status, count in counts.items():
+            by_status[status] += count
+    return {
+        "concurrency": concurrency,
+        "requests": len(all_latencies),
+        "errors": sum(by_status.values()),
+        "errors_by_status": dict(sorted(by_status.items())),
+        "throughput_rps": len(all_latencies) / wall,
+        "p50_ms": percentile(all_latencies, 50),
+        "p95_ms": percentile(all_latencies, 95),
+        "p99_ms": percentile(all_latencies, 99),
+        "scenarios": {
+            name: {
+                "requests": len(values),
+                "errors": sum(errors[name].values()),
+                "errors_by_status": dict(errors[name]),
+                "p50_ms": percentile(values, 50),
+                "p99_ms": percentile(values, 99),
+            }
+            for name, values in latencies.items()
+        } | {
+            # Scénarios dont toutes les requêtes ont échoué
+            name: {"requests": 0, "errors": sum(counts.values()), "errors_by_status": dict(counts)}
+            for name, counts in errors.items() if name not in latencies
+        },
+    }
+
+
+async def main_loadtest(args):
+    random.seed(args.seed)
+    logo = make_logo_bytes()
+    logo_server = LogoServer(args.logo_latency_ms, logo)
+    await logo_server.start()
+
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        import main
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://loadtest"
+
+    weights = parse_mix(args.mix)
+    tenants = tenant_headers(args.tenants, args.plan)
+    curve = []
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        redirect_ids = await create_redirect_ids(client, tenants, 20) if weights.get("redirect") else []
+        scenarios = Scenarios(client, tenants, logo, logo_server.url, redirect_ids)
+        print(f"{'concurrence':>11} {'req/s':>9} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} {'erreurs':>8}")
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            result = await run_step(scenarios, weights, concurrency, args.duration)
+            curve.append(result)
+            print(
+                f"{concurrency:>11} {result['throughput_rps']:>9.1f} {result['p50_ms']:>10.1f} "
+                f"{result['p95_ms']:>10.1f} {result['p99_ms']:>10.1f} {result['errors']:>8}"
+            )
+            if result["errors_by_status"]:
+                detail = ", ".join(f"{status}: {count}" for status, count in result["errors_by_status"].items())
+                print(f"{'':>11} erreurs par code : {detail}")
+
+    await logo_server.stop()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "mix": weights, "logo_latency_ms": args.logo_latency_ms,
+                "tenants": args.tenants, "plan": args.plan, "curve": curve,
+            }, f, indent=2)
+        print(f"\n💾 Courbe enregistrée dans {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL de l'API (sinon application ASGI en processus)")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32")
+    parser.add_argument("--duration", type=float, default=10.0, help="durée de chaque palier en secondes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="poids des scénarios, ex. " + DEFAULT_MIX)
+    parser.add_argument("--logo-latency-ms", type=float, default=50.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--tenants", type=int, default=20, help="nombre de locataires simulés")
+    parser.add_argument("--plan", default="BASIC", help="offre(s) RapidAPI des locataires, ex. BASIC,PRO,MEGA")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="fichier JSON où enregistrer la courbe")
+    asyncio.run(main_loadtest(parser.parse_args()))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks reproductible de l'API QR Code (en processus, sans réseau).
+
+Couvre l'encodage, toutes les combinaisons MODULE_STYLES × GRADIENTS, un style
+enregistré (style_id), les tailles de 128 à 2000 px, chaque format de sortie,
+la transparence, le logo, la légende, le cache (hit/miss) et le débit de /redirect.
+
+Usage :
+    python benchmarks/run_benchmarks.py --save baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --threshold 0.15
+    python benchmarks/run_benchmarks.py --filter style/ --rounds 10
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+
+HEADERS = {"x-rapidapi-host": "benchmark"}
+DATA = "https://github.com/MOMOMALFOY?tab=repositories"
+SIZES = [128, 256, 512, 1000, 2000]
+FORMATS = ["png", "svg", "pdf", "webp"]
+ENCODE_PAYLOADS = {
+    "short": "https://example.com",
+    "long": "https://shop.example.com/products/summer-collection/item?id=1234567890&utm_source=newsletter",
+    "numeric": "4006381333931" * 8,
+}
+
+_loop = asyncio.new_event_loop()
+
+
+def make_logo() -> Image.Image:
+    buf = io.BytesIO()
+    Image.new("RGB", (512, 512), (200, 30, 30)).save(buf, format="PNG")
+    return Image.open(io.BytesIO(buf.getvalue())).convert("RGBA")
+
+
+def render(**params):
+    """Rend un QR code sans cache via generate_qr_core et lit tout le corps."""
+    main.QR_CACHE.clear()
+
+    async def run():
+        response = await main.generate_qr_core(**params)
+        total = 0
+        async for chunk in response.body_iterator:
+            total += len(chunk)
+        return total
+
+    return _loop.run_until_complete(run())
+
+
+def build_cases(client: TestClient) -> dict:
+    """Retourne {nom: fonction} pour chaque scénario mesuré."""
+    cases = {}
+
+    for name, payload in ENCODE_PAYLOADS.items():
+        def encode(payload=payload):
+            main.optimal_segments.cache_clear()
+            main.make_qr(payload)
+        cases[f"encode/{name}"] = encode
+
+    for style in main.MODULE_STYLES:
+        for gradient in main.GRADIENTS:
+            cases[f"style/{style}-{gradient}"] = lambda style=style, gradient=gradient: render(
+                data=DATA, module_style=style, gradient_type=gradient,
+                start_color="#FF0000", end_color="#0000FF",
+            )
+
+    main.register_style("benchmark", module_style="rounded", gradient_type="radial",
+                        start_color="#FF0000", end_color="#0000FF")
+    cases["style/preset-rounded-radial"] = lambda: render(data=DATA, style_id="benchmark")
+
+    for size in SIZES:
+        cases[f"size/{size}"] = lambda size=size: render(data=DATA, size=size)
+
+    for file in FORMATS:
+        cases[f"format/{file}"] = lambda file=file: render(data=DATA, file=file)
+
+    cases["feature/transparent"] = lambda: render(data=DATA, transparent=True)
+    logo = make_logo()
+    cases["feature/logo"] = lambda: render(data=DATA, logo_img=logo.copy())
+    cases["feature/caption"] = lambda: render(data=DATA, caption="Scannez-moi")
+
+    params = {"data": DATA, "size": 400}
+
+    def cache_miss():
+        main.QR_CACHE.clear()
+        client.get("/generate-qr", params=params, headers=HEADERS)
+
+    def cache_hit():
+        client.get("/generate-qr", params=params, headers=HEADERS)
+
+    cases["cache/miss"] = cache_miss
+    cases["cache/hit"] = cache_hit
+
+    qr_id = "benchmark-redirect"
+    main.DYNAMIC_QR_DB[qr_id] = {
+        "target_url": "https://example.com",
+        "expire_at": datetime.utcnow() + timedelta(days=1),
+    }
+
+    def redirect(batch=50):
+        for _ in range(batch):
+            client.get(f"/redirect/{qr_id}", headers=HEADERS, follow_redirects=False)
+    redirect.batch = 50
+    cases["redirect/x50"] = redirect
+
+    return cases
+
+
+def measure(func, rounds: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    result = {
+        "min_ms": min(samples),
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "stddev_ms": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+    }
+    batch = getattr(func, "batch", None)
+    if batch:
+        result["ops_per_s"] = batch * 1000 / result["median_ms"]
+    return result
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> int:
+    """Affiche les écarts de médiane et retourne le nombre de régressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = 0
+    print(f"\nComparaison avec {baseline_path} (seuil {threshold:.0%})")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_ms"], result["median_ms"]
+        delta = (after - before) / before if before else 0.0
+        marker = ""
+        if delta > threshold:
+            marker = "  ❌ RÉGRESSION"
+            regressions += 1
+        elif delta < -threshold:
+            marker = "  🚀"
+        print(f"  {name:<32} {before:>9.2f} → {after:>9.2f} ms ({delta:+.1%}){marker}")
+    return regressions
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--filter", default="", help="ne lancer que les cas contenant cette chaîne")
+    parser.add_argument("--save", help="fichier JSON où enregistrer les résultats")
+    parser.add_argument("--compare", help="fichier JSON de référence à comparer")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    client = TestClient(main.app)
+    cases = build_cases(client)
+    results = {}
+    for name, func in cases.items():
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, args.rounds, args.warmup)
+        extra = f"  {results[name]['ops_per_s']:.0f} op/s" if "ops_per_s" in results[name] else ""
+        print(f"{name:<32} médiane {results[name]['median_ms']:>9.2f} ms  min {results[name]['min_ms']:>9.2f} ms{extra}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\n💾 Résultats enregistrés dans {args.save}")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Génération de QR codes en masse, hors HTTP, avec le même pipeline de rendu que l'API.
+
+Lit un CSV (en-tête = noms des paramètres) ou un JSONL (un objet par ligne) de paramètres
+de generate_qr_core : data, file, size, bg_color, transparent, module_style,
+gradient_type, start_color, caption, logo_url, logo_id, error_correction, plus une colonne
+facultative "name" (nom du fichier produit). body_color et end_color sont acceptés et ignorés
+comme par /generate-qr (le dégradé va de start_color à bg_color), avec un avertissement.
+
+Les lignes sont rendues par un pool de processus (un par cœur, distribution par paquets) et
+écrites au fil de l'eau dans le répertoire de sortie :
+    --format files : un fichier par ligne (NAME.png, NAME.svg, ...)
+    --format zip   : archives part-00001.zip, part-00002.zip, ... de --volume-size lignes
+    --format pdf   : planches sheet-00001.pdf, ... (grille --columns x --rows par page A4)
+
+La progression est enregistrée dans OUTPUT/.progress.json : relancer la même commande reprend
+après la dernière ligne (fichiers) ou le dernier volume (zip, pdf) terminé. Les lignes en
+erreur sont consignées dans OUTPUT/errors.jsonl. La mémoire reste bornée quel que soit le
+nombre de lignes (lecture paresseuse, tâches en vol limitées, sorties écrites en flux).
+
+Usage :
+    python bulk_generate.py codes.csv --output out/
+    python bulk_generate.py codes.jsonl --output out/ --format zip --volume-size 20000
+    python bulk_generate.py codes.csv --output planches/ --format pdf --columns 4 --rows 6
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from array import array
+
+from PIL import Image
+
+import main
+
+PARAMS = (
+    "data", "file", "size", "bg_color", "transparent", "module_style", "gradient_type",
+    "start_color", "caption", "logo_url", "logo_id", "error_correction",
+)
+# Acceptés par /generate-qr mais sans effet sur son rendu : ignorés de la même façon
+IGNORED_PARAMS = {
+    "body_color": "body_color est ignoré : la couleur des modules est start_color",
+    "end_color": "end_color est ignoré : le dégradé va de start_color à bg_color",
+}
+EXTENSIONS = {"image/svg+xml": "svg", "application/pdf": "pdf"}
+PAGE_WIDTH, PAGE_HEIGHT, PAGE_MARGIN = 595, 842, 36  # A4 en points
+PROGRESS_FILE = ".progress.json"
+
+_raster_only = False  # vrai dans les workers d'une sortie PDF (pixels plutôt que fichier encodé)
+
+
+def _parse_json_line(line: str):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def read_rows(path: str):
+    """Itère paresseusement (index, name, paramètres) sur un CSV ou un JSONL (paramètres None si illisible)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows = (_parse_json_line(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for index, row in enumerate(rows):
+            if row is None:
+                yield index, None, None
+                continue
+            row = {key: value for key, value in row.items() if key is not None and value not in ("", None)}
+            yield index, row.pop("name", None) or row.pop("filename", None), row
+
+
+def safe_name(name, index: int) -> str:
+    if not name:
+        return f"{index:08d}"
+    return re.sub(r"[^A-Za-z0-9._-]", "_", str(name))[:128]
+
+
+def is_true(value) -> bool:
+    return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes", "oui")
+
+
+def render_params(params: dict, raster: bool = False) -> tuple:
+    """Rendu synchrone d'une ligne, normalisée comme dans generate_qr_core ; retourne (contenu, media_type)."""
+    if params is None:
+        raise ValueError("ligne illisible (objet JSON attendu)")
+    unknown = set(params) - set(PARAMS) - set(IGNORED_PARAMS)
+    if unknown:
+        raise ValueError(f"paramètres inconnus : {', '.join(sorted(unknown))}")
+    if not params.get("data"):
+        raise ValueError("data est obligatoire")
+    file = str(params.get("file") or "png").lower()
+    if file not in main.OUTPUT_FORMATS:
+        raise ValueError(f"format invalide : {file} ({', '.join(main.OUTPUT_FORMATS)})")
+    size = int(params.get("size") or 400)
+    bg_color = str(params.get("bg_color") or "#FFFFFF")
+    transparent = is_true(params.get("transparent", False))
+    module_style = str(params.get("module_style") or "square")
+    gradient_type = str(params.get("gradient_type") or "solid")
+    logo_id = str(params.get("logo_id") or "")
+    logo_url = str(params.get("logo_url") or "")
+    if transparent:
+        bg_color = "#FFFFFF"
+        if file not in ("png", "webp"):
+            file = "webp"
+    if raster:
+        file = "png"
+    # Mêmes limites de taille et de coût que l'API
+    main.estimate_render_cost(size, module_style, gradient_type, transparent)
+    if logo_id:
+        logo_id = main.LOGOS.check(logo_id)
+    logo_img = None
+    if logo_url and not logo_id:
+        logo_img = asyncio.run(main.fetch_logo(logo_url, int(size * 0.2)))
+    return main.render_qr_bytes(
+        str(params["data"]), file, size, bg_color, transparent, module_style, gradient_type,
+        str(params.get("start_color") or "#000000"), str(params.get("caption") or ""), logo_img,
+        str(params.get("error_correction") or "auto"), logo_img is not None or bool(logo_url) or bool(logo_id),
+        logo_id,
+    )
+
+
+def _init_worker(raster_only: bool):
+    global _raster_only
+    _raster_only = raster_only
+    # Déjà fait par le parent avec fork ; nécessaire avec spawn/forkserver
+    main.preload_rendering()
+
+
+def render_row(item: tuple) -> tuple:
+    """Exécuté dans un worker : (index, name, contenu | None, extension | message d'erreur)."""
+    index, name, params = item
+    try:
+        content, media_type = render_params(params, raster=_raster_only)
+    except main.HTTPException as exc:
+        return index, name, None, str(exc.detail)
+    except (ValueError, OSError) as exc:
+        return index, name, None, str(exc)
+    except Exception as exc:
+        # Une ligne ne doit jamais interrompre le pool : l'erreur rejoint errors.jsonl
+        return index, name, None, f"erreur interne : {type(exc).__name__}: {exc}"
+    if _raster_only:
+        # Pixels RGB compressés prêts pour le PDF : le processus principal ne fait qu'écrire
+        img = Image.open(io.BytesIO(content))
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            flat = Image.new("RGB", img.size, (255, 255, 255))
+            flat.paste(img, mask=img.getchannel("A"))
+            img = flat
+        img = img.convert("RGB")
+        return index, name, (img.width, img.height, zlib.compress(img.tobytes(), 6)), "raster"
+    return index, name, content, EXTENSIONS.get(media_type, media_type.split("/")[-1])
+
+
+def warn_ignored(rows):
+    """Signale une seule fois chaque paramètre ignoré (body_color, end_color) rencontré dans l'entrée."""
+    warned = set()
+    for index, name, params in rows:
+        for key in sorted((set(params or ()) & set(IGNORED_PARAMS)) - warned):
+            warned.add(key)
+            print(f"Avertissement (ligne {index + 1}) : {IGNORED_PARAMS[key]}", file=sys.stderr)
+        yield index, name, params
+
+
+def bounded(items, slots: threading.BoundedSemaphore, stop: threading.Event):
+    """
+    Ne laisse le pool lire une nouvelle ligne que lorsqu'un résultat a été consommé.
+    `stop` débloque le thread d'alimentation du pool (sinon terminate() l'attendrait indéfiniment).
+    """
+    for item in items:
+        while not slots.acquire(timeout=0.5):
+            if stop.is_set():
+                return
+        yield item
+
+
+class PdfSheetWriter:
+    """
+    Écrit une planche PDF en flux : chaque image est écrite dès réception, seuls les
+    décalages des objets (pour la table xref) et la page en cours restent en mémoire.
+    """
+
+    def __init__(self, path: str, columns: int, rows: int):
+        self.f = open(path, "wb")
+        self.columns = columns
+        self.rows = rows
+        self.offsets = array("Q", [0, 0, 0, 0])  # objets 1 (catalogue), 2 (pages), 3 (police)
+        self.pages = array("Q")
+        self.cells = []  # (numéro d'objet image, légende) de la page en cours
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    def _new_object(self) -> int:
+        self.offsets.append(0)
+        return len(self.offsets) - 1
+
+    def _write_object(self, number: int, body: bytes, stream: bytes = None):
+        self.offsets[number] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % number + body)
+        if stream is not None:
+            self.f.write(b"\nstream\n" + stream + b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add(self, width: int, height: int, deflated_rgb: bytes, label: str):
+        number = self._new_object()
+        self._write_object(
+            number,
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>" % (width, height, len(deflated_rgb)),
+            deflated_rgb,
+        )
+        self.cells.append((number, label))
+        if len(self.cells) == self.columns * self.rows:
+            self._flush_page()
+
+    def _flush_page(self):
+        cell_w = (PAGE_WIDTH - 2 * PAGE_MARGIN) / self.columns
+        cell_h = (PAGE_HEIGHT - 2 * PAGE_MARGIN) / self.rows
+        side = min(cell_w, cell_h - 12) * 0.9
+        ops, xobjects = [], []
+        for i, (number, label) in enumerate(self.cells):
+            col, row = i % self.columns, i // self.columns
+            x = PAGE_MARGIN + col * cell_w + (cell_w - side) / 2
+            y = PAGE_HEIGHT - PAGE_MARGIN - (row + 1) * cell_h + 12 + (cell_h - 12 - side) / 2
+            text = label.encode("latin-1", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+            ops.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /Im%d Do Q" % (side, side, x, y, i))
+            ops.append(b"BT /F1 7 Tf %.2f %.2f Td (%s) Tj ET" % (x, y - 9, text))
+            xobjects.append(b"/Im%d %d 0 R" % (i, number))
+        content = zlib.compress(b"\n".join(ops))
+        content_number = self._new_object()
+        self._write_object(content_number, b"<< /Filter /FlateDecode /Length %d >>" % len(content), content)
+        page_number = self._new_object()
+        self._write_object(
+            page_number,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /XObject << %s >> /Font << /F1 3 0 R >> >> >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_number, b" ".join(xobjects)),
+        )
+        self.pages.append(page_number)
+        self.cells = []
+
+    def close(self):
+        if self.cells:
+            self._flush_page()
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        self._write_object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)))
+        xref = self.f.tell()
+        self.f.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for offset in self.offsets[1:]:
+            self.f.write(b"%010d 00000 n \n" % offset)
+        self.f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(self.offsets), xref))
+        self.f.close()
+
+
+class Output:
+    """Répertoire de sortie : fichiers, volumes ZIP ou planches PDF, avec point de reprise."""
+
+    def __init__(self, args):
+        self.args = args
+        self.directory = args.output
+        self.volume = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def volume_size(self) -> int:
+        if self.args.format == "pdf":
+            return self.args.volume_pages * self.args.columns * self.args.rows
+        return self.args.volume_size
+
+    def _open_volume(self, index: int):
+        number = index // self.volume_size + 1
+        if self.args.format == "zip":
+            path = os.path.join(self.directory, f"part-{number:05d}.zip")
+            self.volume = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED)
+        else:
+            path = os.path.join(self.directory, f"sheet-{number:05d}.pdf")
+            self.volume = PdfSheetWriter(path, self.args.columns, self.args.rows)
+
+    def write(self, name: str, content, ext: str, index: int):
+        if self.args.format == "files":
+            with open(os.path.join(self.directory, f"{name}.{ext}"), "wb") as f:
+                f.write(content)
+            return
+        if self.volume is None:
+            self._open_volume(index)
+        if self.args.format == "zip":
+            self.volume.writestr(f"{name}.{ext}", content)
+        else:
+            self.volume.add(*content, name)
+
+    def advance(self, index: int) -> bool:
+        """Ligne traitée (écrite ou en erreur) ; retourne True quand un point de reprise est atteint."""
+        period = self.args.checkpoint if self.args.format == "files" else self.volume_size
+        if (index + 1) % period:
+            return False
+        # Un volume n'est complet (et la reprise possible après lui) qu'une fois fermé
+        self.close()
+        return True
+
+    def close(self):
+        if self.volume is not None:
+            self.volume.close()
+            self.volume = None
+
+
+def load_progress(path: str, signature: dict, restart: bool) -> int:
+    if restart or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        progress = json.load(f)
+    if progress.get("signature") != signature:
+        sys.exit(f"{path} a été produit avec d'autres options : relancer avec --restart ou les mêmes options.")
+    return int(progress.get("rows_done", 0))
+
+
+def trim_errors(path: str, rows_done: int):
+    """Ne garde que les erreurs des lignes avant le point de reprise : les suivantes seront rendues à nouveau."""
+    if not os.path.exists(path):
+        return
+    tmp_path = f"{path}.tmp"
+    with open(path, encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            try:
+                if json.loads(line)["row"] < rows_done:
+                    dst.write(line)
+            except (ValueError, KeyError, TypeError):
+                continue
+    os.replace(tmp_path, path)
+
+
+def save_progress(path: str, signature: dict, rows_done: int):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"signature": signature, "rows_done": rows_done}, f)
+    os.replace(tmp_path, path)
+
+
+def run(args) -> int:
+    output = Output(args)
+    progress_path = os.path.join(args.output, PROGRESS_FILE)
+    signature = {
+        "input": os.path.abspath(args.input), "format": args.format, "volume_size": output.volume_size,
+    }
+    rows_done = load_progress(progress_path, signature, args.restart)
+    if rows_done:
+        print(f"Reprise après {rows_done} lignes")
+
+    rows = warn_ignored((index, name, params) for index, name, params in read_rows(args.input) if index >= rows_done)
+    # Assez de tâches en vol pour occuper tous les workers, mais une mémoire bornée
+    slots = threading.BoundedSemaphore(args.processes * args.chunksize * 4)
+    stop = threading.Event()
+    errors_path = os.path.join(args.output, "errors.jsonl")
+    trim_errors(errors_path, rows_done)
+    errors = open(errors_path, "a", encoding="utf-8")
+    start, rendered, failed = time.perf_counter(), 0, 0
+    # Charger le rendu avant le fork : les workers en héritent au lieu de l'importer chacun
+    main.preload_rendering()
+    with multiprocessing.Pool(args.processes, initializer=_init_worker, initargs=(args.format == "pdf",)) as pool:
+        try:
+            for index, name, content, ext in pool.imap(render_row, bounded(rows, slots, stop), chunksize=args.chunksize):
+                slots.release()
+                name = safe_name(name, index)
+                if content is None:
+                    failed += 1
+                    errors.write(json.dumps({"row": index, "name": name, "error": ext}, ensure_ascii=False) + "\n")
+                else:
+                    rendered += 1
+                    output.write(name, content, ext, index)
+                if output.advance(index):
+                    errors.flush()
+                    save_progress(progress_path, signature, index + 1)
+                if args.verbose and (rendered + failed) % 1000 == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"{index + 1} lignes ({(rendered + failed) / elapsed:.0f}/s)")
+            output.close()
+            if rendered or failed:
+                save_progress(progress_path, signature, index + 1)
+        finally:
+            stop.set()
+            errors.close()
+    elapsed = time.perf_counter() - start
+    print(f"{rendered} QR codes générés, {failed} erreurs en {elapsed:.1f} s "
+          f"({(rendered + failed) / elapsed if elapsed else 0:.0f} lignes/s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="fichier CSV ou JSONL (.jsonl, .ndjson) de paramètres")
+    parser.add_argument("--output", required=True, help="répertoire de sortie")
+    parser.add_argument("--format", choices=("files", "zip", "pdf"), default="files")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=16, help="lignes envoyées à la fois à un worker")
+    parser.add_argument("--volume-size", type=int, default=10000, help="lignes par archive ZIP")
+    parser.add_argument("--volume-pages", type=int, default=50, help="pages par planche PDF")
+    parser.add_argument("--columns", type=int, default=4, help="colonnes par page PDF")
+    parser.add_argument("--rows", type=int, default=6, help="lignes par page PDF")
+    parser.add_argument("--checkpoint", type=int, default=1000, help="lignes entre deux points de reprise (files)")
+    parser.add_argument("--restart", action="store_true", help="ignorer la progression enregistrée")
+    parser.add_argument("--verbose", action="store_true")
+    sys.exit(run(parser.parse_args()))
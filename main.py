@@ -1,46 +1,82 @@
-from fastapi import FastAPI, UploadFile, File, Form, Query, Request, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, UploadFile, File, Form, Query, Request, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse, PlainTextResponse, Response
 from typing import Optional
-import qrcode
-from qrcode.image.styledpil import StyledPilImage
-from qrcode.image.styles.moduledrawers import RoundedModuleDrawer, GappedSquareModuleDrawer, CircleModuleDrawer, VerticalBarsDrawer, HorizontalBarsDrawer, SquareModuleDrawer
-from qrcode.image.styles.colormasks import SolidFillColorMask, RadialGradiantColorMask, HorizontalGradiantColorMask, VerticalGradiantColorMask
-from PIL import Image, ImageDraw, ImageFont
+# qrcode, httpx et les modules de dessin de Pillow sont importés au premier usage
+# (ou par preload_rendering()) : /ping et /redirect n'en ont pas besoin.
+from PIL import Image
 import io
 import base64
 import uuid
 from datetime import datetime, timedelta
-import httpx
-from qrcode.image.svg import SvgImage
-from qrcode.constants import ERROR_CORRECT_H
+from bisect import bisect_left
+from collections.abc import Mapping
+import importlib
+from functools import lru_cache
 import os
 import hashlib
 import json
+import re
+import threading
+import time
+import random
+import asyncio
+import heapq
+import mmap
+import struct
+import functools
+from collections import defaultdict, deque, OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from starlette.datastructures import Headers
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 
-app = FastAPI(title="QR Code API")
+@asynccontextmanager
+async def lifespan(app):
+    """Démarrage : restauration du cache, préchauffage et chargement du rendu ; arrêt : instantané du cache."""
+    await cache_startup()
+    if QR_PRELOAD_RENDERING == "startup":
+        # En arrière-plan : /ping et /redirect répondent pendant le chargement
+        _start_background(run_in_threadpool(preload_rendering))
+    try:
+        yield
+    finally:
+        await cache_shutdown()
+
+app = FastAPI(title="QR Code API", lifespan=lifespan)
 
 # --- AJOUT : Vérification proxy RapidAPI ---
+# Locataire (x-rapidapi-user) et offre (x-rapidapi-subscription) de la requête en cours
+CURRENT_TENANT: ContextVar[tuple] = ContextVar("current_tenant", default=("anonymous", "BASIC"))
+
 async def verify_rapidapi_proxy(request: Request):
     if not (request.headers.get("x-rapidapi-host") or request.headers.get("x-rapidapi-user")):
         raise HTTPException(status_code=401, detail="Accès uniquement via le proxy RapidAPI.")
+    CURRENT_TENANT.set((
+        request.headers.get("x-rapidapi-user") or "anonymous",
+        (request.headers.get("x-rapidapi-subscription") or "BASIC").upper(),
+    ))
 
 # Stockage en mémoire pour les QR dynamiques
 DYNAMIC_QR_DB = {}
 
 # --- AJOUT : Cache pour les QR codes fréquemment demandés ---
 QR_CACHE = {}
+CACHE_HITS = defaultdict(int)  # clé -> nombre de hits (chaleur, pour l'instantané)
 CACHE_MAX_SIZE = 100  # Nombre maximum d'éléments en cache
 CACHE_EXPIRY_HOURS = 24  # Expiration du cache en heures
 
 def get_cache_key(data: str, file: str, size: int, body_color: str, bg_color: str, 
                  transparent: bool, module_style: str, gradient_type: str, 
-                 start_color: str, end_color: str, caption: str, logo_url: str) -> str:
+                 start_color: str, end_color: str, caption: str, logo_url: str,
+                 error_correction: str = "auto", logo_id: str = "", style_key: str = "") -> str:
     """Génère une clé unique pour le cache basée sur les paramètres"""
     cache_data = {
         'data': data, 'file': file, 'size': size, 'body_color': body_color,
         'bg_color': bg_color, 'transparent': transparent, 'module_style': module_style,
         'gradient_type': gradient_type, 'start_color': start_color, 'end_color': end_color,
-        'caption': caption, 'logo_url': logo_url
+        'caption': caption, 'logo_url': logo_url, 'error_correction': error_correction,
+        'logo_id': logo_id, 'style_key': style_key
     }
     return hashlib.md5(json.dumps(cache_data, sort_keys=True).encode()).hexdigest()
 
@@ -55,30 +91,594 @@ def cleanup_cache():
     
     for key in expired_keys:
         del QR_CACHE[key]
+        CACHE_HITS.pop(key, None)
     
     # Si le cache est encore trop plein, supprimer les entrées les plus anciennes
+    items_to_remove = 0
     if len(QR_CACHE) > CACHE_MAX_SIZE:
         sorted_items = sorted(QR_CACHE.items(), key=lambda x: x[1][1])
         items_to_remove = len(QR_CACHE) - CACHE_MAX_SIZE
         for i in range(items_to_remove):
             del QR_CACHE[sorted_items[i][0]]
+            CACHE_HITS.pop(sorted_items[i][0], None)
+    CACHE_STATS["evictions"] += len(expired_keys) + max(items_to_remove, 0)
+
+# --- AJOUT : Métriques au format Prometheus ---
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Histogramme minimal (compteurs par bucket, cumulés seulement à l'export)."""
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def export(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+REQUEST_COUNT = defaultdict(int)  # (méthode, route, statut) -> nombre
+REQUEST_LATENCY = defaultdict(Histogram)  # (méthode, route) -> histogramme
+STAGE_LATENCY = defaultdict(Histogram)  # étape du rendu -> histogramme
+CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "snapshot_restores": 0}
+RENDER_STATS = {"in_progress": 0}
+
+# Durées des étapes de la requête en cours, renvoyées dans l'en-tête Server-Timing
+REQUEST_TIMINGS: ContextVar[Optional[list]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def stage(name: str):
+    """Mesure la durée d'une étape du pipeline de rendu."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY[name].observe(elapsed)
+        timings = REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+def format_server_timing(timings: list) -> str:
+    """Formate les étapes mesurées pour l'en-tête Server-Timing (durées en ms)."""
+    parts = []
+    for name, value in timings:
+        if isinstance(value, str):
+            parts.append(f'{name};desc="{value}"')
+        else:
+            parts.append(f"{name};dur={value * 1000:.2f}")
+    return ", ".join(parts)
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI comptant les requêtes et leur latence par route.
+    Il ajoute aussi l'en-tête Server-Timing et décide du profilage échantillonné.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+        timings = []
+        timings_token = REQUEST_TIMINGS.set(timings)
+        profile_token = PROFILE_REQUESTED.set(should_profile(scope))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if timings:
+                    timings.append(("total", time.perf_counter() - start))
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", format_server_timing(timings).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Le routeur renseigne scope["route"] : on garde le gabarit pour limiter la cardinalité
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_COUNT[(method, path, status[0])] += 1
+            REQUEST_LATENCY[(method, path)].observe(time.perf_counter() - start)
+            REQUEST_TIMINGS.reset(timings_token)
+            PROFILE_REQUESTED.reset(profile_token)
+
+def _label(value) -> str:
+    """Échappe une valeur de label Prometheus."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_metrics() -> str:
+    """Sérialise toutes les métriques au format texte Prometheus."""
+    lines = ["# TYPE qr_http_requests_total counter"]
+    for (method, path, status), count in sorted(REQUEST_COUNT.items()):
+        lines.append(f'qr_http_requests_total{{method="{method}",route="{path}",status="{status}"}} {count}')
+    lines.append("# TYPE qr_http_request_duration_seconds histogram")
+    for (method, path), hist in sorted(REQUEST_LATENCY.items()):
+        lines.extend(hist.export("qr_http_request_duration_seconds", f'method="{method}",route="{path}"'))
+    lines.append("# TYPE qr_render_stage_duration_seconds histogram")
+    for name, hist in sorted(STAGE_LATENCY.items()):
+        lines.extend(hist.export("qr_render_stage_duration_seconds", f'stage="{name}"'))
+    lines.append("# TYPE qr_cache_hits_total counter")
+    lines.append(f"qr_cache_hits_total {CACHE_STATS['hits']}")
+    lines.append("# TYPE qr_cache_misses_total counter")
+    lines.append(f"qr_cache_misses_total {CACHE_STATS['misses']}")
+    lines.append("# TYPE qr_cache_evictions_total counter")
+    lines.append(f"qr_cache_evictions_total {CACHE_STATS['evictions']}")
+    lines.append("# TYPE qr_cache_entries gauge")
+    lines.append(f"qr_cache_entries {len(QR_CACHE)}")
+    lines.append("# TYPE qr_cache_bytes gauge")
+    lines.append(f"qr_cache_bytes {sum(len(content) for content, _ in QR_CACHE.values())}")
+    lines.append("# TYPE qr_cache_snapshot_pending gauge")
+    lines.append(f"qr_cache_snapshot_pending {len(CACHE_SNAPSHOT.index)}")
+    lines.append("# TYPE qr_cache_snapshot_restores_total counter")
+    lines.append(f"qr_cache_snapshot_restores_total {CACHE_STATS['snapshot_restores']}")
+    lines.append("# TYPE qr_ready gauge")
+    lines.append(f"qr_ready {0 if READINESS['warming'] else 1}")
+    lines.append("# TYPE qr_dynamic_codes gauge")
+    lines.append(f"qr_dynamic_codes {len(DYNAMIC_QR_DB)}")
+    lines.append("# TYPE qr_stream_connections gauge")
+    lines.append(f"qr_stream_connections {STREAM_STATS['connections']}")
+    lines.append("# TYPE qr_stream_jobs_total counter")
+    for status, count in sorted(STREAM_JOBS.items()):
+        lines.append(f'qr_stream_jobs_total{{status="{status}"}} {count}')
+    lines.append("# TYPE qr_style_presets gauge")
+    lines.append(f"qr_style_presets {len(STYLE_PRESETS)}")
+    lines.append("# TYPE qr_logo_variant_lookups_total counter")
+    for result, count in sorted(LOGOS.stats.items()):
+        lines.append(f'qr_logo_variant_lookups_total{{result="{result}"}} {count}')
+    lines.append("# TYPE qr_logo_disk_bytes gauge")
+    lines.append(f"qr_logo_disk_bytes {LOGOS.disk_bytes}")
+    lines.append("# TYPE qr_logo_evictions_total counter")
+    lines.append(f"qr_logo_evictions_total {LOGOS.evictions}")
+    lines.append("# TYPE qr_render_in_progress gauge")
+    lines.append(f"qr_render_in_progress {RENDER_STATS['in_progress']}")
+    lines.append("# TYPE qr_admission_inflight_cost gauge")
+    lines.append(f"qr_admission_inflight_cost {ADMISSION.in_flight}")
+    lines.append("# TYPE qr_admission_budget gauge")
+    lines.append(f"qr_admission_budget {ADMISSION.budget}")
+    lines.append("# TYPE qr_admission_queue_depth gauge")
+    lines.append(f"qr_admission_queue_depth {len(ADMISSION.waiters)}")
+    lines.append("# TYPE qr_admission_rejected_total counter")
+    for reason, count in sorted(ADMISSION.rejected.items()):
+        lines.append(f'qr_admission_rejected_total{{reason="{reason}"}} {count}')
+    lines.append("# TYPE qr_scheduler_running gauge")
+    lines.append(f"qr_scheduler_running {SCHEDULER.running}")
+    lines.append("# TYPE qr_scheduler_queue_depth gauge")
+    lines.append(f"qr_scheduler_queue_depth {len(SCHEDULER.queue)}")
+    lines.append("# TYPE qr_scheduler_rejected_total counter")
+    for reason, count in sorted(SCHEDULER.rejected.items()):
+        lines.append(f'qr_scheduler_rejected_total{{reason="{reason}"}} {count}')
+    lines.append("# TYPE qr_tenant_queue_wait_seconds histogram")
+    for tenant, hist in sorted(SCHEDULER.queue_wait.items()):
+        lines.extend(hist.export("qr_tenant_queue_wait_seconds", f'tenant="{_label(tenant)}"'))
+    lines.append("# TYPE qr_tenant_render_seconds histogram")
+    for tenant, hist in sorted(SCHEDULER.render_time.items()):
+        lines.extend(hist.export("qr_tenant_render_seconds", f'tenant="{_label(tenant)}"'))
+    return "\n".join(lines) + "\n"
+
+# --- AJOUT : Profilage échantillonné du rendu ---
+# QR_PROFILE_SAMPLE_RATE : fraction des requêtes profilées (0 = désactivé)
+# QR_PROFILE_TOKEN : l'en-tête x-qr-profile égal à ce jeton force le profilage
+PROFILE_SAMPLE_RATE = float(os.environ.get("QR_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("QR_PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("QR_PROFILE_DIR", "profiles")
+PROFILE_REQUESTED: ContextVar[bool] = ContextVar("profile_requested", default=False)
+
+def should_profile(scope) -> bool:
+    """Décide si la requête doit être profilée (jeton admin ou tirage aléatoire)."""
+    if PROFILE_TOKEN and Headers(scope=scope).get("x-qr-profile") == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+@contextmanager
+def profile_session(name: str, async_mode: bool = False):
+    """
+    Profile le bloc et écrit le résultat dans PROFILE_DIR.
+    Utilise pyinstrument (profil speedscope) s'il est installé, sinon cProfile
+    (fichier .prof, convertible en flame graph avec flameprof ou snakeviz).
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{name}-{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}")
+    try:
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError:
+        Profiler = None
+    if Profiler is not None:
+        profiler = Profiler(async_mode="enabled" if async_mode else "disabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = base + ".speedscope.json"
+            with open(path, "w") as f:
+                f.write(profiler.output(renderer=SpeedscopeRenderer()))
+            _record_profile(path)
+        return
+    import cProfile
+    # cProfile mesure tout le thread : en mode asynchrone, les coroutines concurrentes peuvent apparaître
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = base + ".prof"
+        profiler.dump_stats(path)
+        _record_profile(path)
+
+_ASYNC_PROFILE_ACTIVE = [False]
+
+def profiled(func):
+    """
+    Profile la fonction (ou coroutine) décorée quand la requête a été échantillonnée.
+    Une coroutine est profilée sur le thread de la boucle (attentes comprises, ex. logo_url) ;
+    le rendu exécuté dans le pool de threads a son propre profil (render_qr_bytes).
+    """
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Un seul profileur à la fois sur le thread de la boucle : les autres requêtes échantillonnées passent
+            if not PROFILE_REQUESTED.get() or _ASYNC_PROFILE_ACTIVE[0]:
+                return await func(*args, **kwargs)
+            _ASYNC_PROFILE_ACTIVE[0] = True
+            try:
+                with profile_session(func.__name__, async_mode=True):
+                    return await func(*args, **kwargs)
+            finally:
+                _ASYNC_PROFILE_ACTIVE[0] = False
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILE_REQUESTED.get():
+            return func(*args, **kwargs)
+        with profile_session(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+def _record_profile(path: str):
+    timings = REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.append(("profile", os.path.basename(path)))
+
+app.add_middleware(MetricsMiddleware)
+
+# --- AJOUT : Contrôle d'admission et budget de pixels ---
+# Coût d'un rendu = pixels de sortie × facteurs de style, de dégradé et de transparence
+QR_MAX_SIZE = int(os.environ.get("QR_MAX_SIZE", "4000"))
+QR_MAX_REQUEST_COST = int(os.environ.get("QR_MAX_REQUEST_COST", str(16_000_000)))
+QR_PIXEL_BUDGET = int(os.environ.get("QR_PIXEL_BUDGET", str(48_000_000)))
+QR_ADMISSION_TIMEOUT = float(os.environ.get("QR_ADMISSION_TIMEOUT", "2.0"))
+QR_ADMISSION_MAX_QUEUE = int(os.environ.get("QR_ADMISSION_MAX_QUEUE", "64"))
+QR_RETRY_AFTER = int(os.environ.get("QR_RETRY_AFTER", "1"))
+
+STYLE_COST_FACTORS = {"square": 1.0, "gapped": 1.0, "vertical": 1.1, "horizontal": 1.1, "rounded": 1.3, "circle": 1.3}
+GRADIENT_COST_FACTORS = {"solid": 1.0, "radial": 3.0, "horizontal": 3.0, "vertical": 3.0}
+TRANSPARENT_COST_FACTOR = 2.0
+
+def estimate_render_cost(size: int, module_style: str = "square", gradient_type: str = "solid",
+                         transparent: bool = False) -> int:
+    """Estime le coût d'un rendu et refuse les tailles hors limites."""
+    size = int(size)
+    if size < 1 or size > QR_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"size doit être compris entre 1 et {QR_MAX_SIZE}.")
+    cost = size * size
+    cost *= STYLE_COST_FACTORS.get(str(module_style), 1.0)
+    cost *= GRADIENT_COST_FACTORS.get(str(gradient_type), 1.0)
+    if transparent:
+        cost *= TRANSPARENT_COST_FACTOR
+    cost = int(cost)
+    if cost > QR_MAX_REQUEST_COST:
+        ADMISSION.rejected["too_large"] += 1
+        raise HTTPException(status_code=413, detail="Rendu trop coûteux : réduisez size ou retirez dégradé/transparence.")
+    return cost
+
+class AdmissionController:
+    """
+    Limite la somme des coûts des rendus en cours (budget global de pixels).
+    Les requêtes excédentaires attendent brièvement en FIFO, puis sont refusées
+    en 503 avec Retry-After pour garder une latence bornée en surcharge.
+    """
+
+    def __init__(self, budget: int, timeout: float, max_queue: int):
+        self.budget = budget
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters = deque()
+        self.rejected = defaultdict(int)
+
+    def _overloaded(self, reason: str) -> HTTPException:
+        self.rejected[reason] += 1
+        return HTTPException(
+            status_code=503,
+            detail="Serveur surchargé, réessayez plus tard.",
+            headers={"Retry-After": str(QR_RETRY_AFTER)},
+        )
+
+    def _wake(self):
+        while self.waiters:
+            cost, future = self.waiters[0]
+            if future.done():
+                self.waiters.popleft()
+                continue
+            if self.in_flight + cost > self.budget and self.in_flight > 0:
+                break
+            self.waiters.popleft()
+            self.in_flight += cost
+            future.set_result(True)
+
+    async def acquire(self, cost: int):
+        # Un rendu plus gros que le budget passe seul quand rien d'autre ne tourne
+        if not self.waiters and (self.in_flight + cost <= self.budget or self.in_flight == 0):
+            self.in_flight += cost
+            return
+        if len(self.waiters) >= self.max_queue:
+            raise self._overloaded("queue_full")
+        future = asyncio.get_running_loop().create_future()
+        entry = (cost, future)
+        self.waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return
+            future.cancel()
+            self.waiters.remove(entry)
+            raise self._overloaded("timeout")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            else:
+                future.cancel()
+                # Ne plus compter dans max_queue ni bloquer la tête de file
+                self.waiters.remove(entry)
+                self._wake()
+            raise
+
+    def release(self, cost: int):
+        self.in_flight -= cost
+        self._wake()
+
+    @asynccontextmanager
+    async def admit(self, cost: int):
+        await self.acquire(cost)
+        try:
+            yield
+        finally:
+            self.release(cost)
+
+ADMISSION = AdmissionController(QR_PIXEL_BUDGET, QR_ADMISSION_TIMEOUT, QR_ADMISSION_MAX_QUEUE)
+
+# --- AJOUT : Ordonnancement équitable par locataire (x-rapidapi-user) ---
+def _parse_limits(value: str) -> dict:
+    """Analyse "CLE=valeur,CLE=valeur" (variables d'environnement)."""
+    limits = {}
+    for item in value.split(","):
+        key, _, number = item.partition("=")
+        if key.strip() and number.strip():
+            limits[key.strip()] = float(number)
+    return limits
+
+QR_RENDER_CONCURRENCY = int(os.environ.get("QR_RENDER_CONCURRENCY", str((os.cpu_count() or 1) * 2)))
+QR_TENANT_MAX_QUEUE = int(os.environ.get("QR_TENANT_MAX_QUEUE", "32"))
+QR_DEFAULT_TENANT_CONCURRENCY = int(os.environ.get("QR_DEFAULT_TENANT_CONCURRENCY", "4"))
+# Poids et limites par offre RapidAPI (en-tête x-rapidapi-subscription)
+PLAN_WEIGHTS = _parse_limits(os.environ.get("QR_PLAN_WEIGHTS", "BASIC=1,PRO=2,ULTRA=4,MEGA=8"))
+PLAN_CONCURRENCY = _parse_limits(os.environ.get("QR_PLAN_CONCURRENCY", "BASIC=2,PRO=4,ULTRA=8,MEGA=16"))
+# Limites spécifiques à certains locataires, prioritaires sur celles de l'offre
+TENANT_CONCURRENCY = _parse_limits(os.environ.get("QR_TENANT_CONCURRENCY", ""))
+QR_METRICS_MAX_TENANTS = int(os.environ.get("QR_METRICS_MAX_TENANTS", "100"))
+
+class TenantState:
+    __slots__ = ("finish", "running", "queued")
+
+    def __init__(self):
+        self.finish = 0.0
+        self.running = 0
+        self.queued = 0
+
+class FairScheduler:
+    """
+    File d'attente équitable pondérée (WFQ) devant le moteur de rendu.
+    Chaque rendu reçoit une étiquette virtuelle coût / poids de l'offre : un
+    locataire qui envoie beaucoup de travail passe après les autres au lieu
+    de les bloquer, et chaque locataire est limité en rendus simultanés.
+    """
+
+    def __init__(self, concurrency: int, timeout: float, max_queue: int):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.running = 0
+        self.virtual_time = 0.0
+        self.tenants = {}
+        self.queue = []  # tas de (étiquette de fin, n°, début, locataire, limite, future)
+        self.sequence = 0
+        self.rejected = defaultdict(int)
+        self.queue_wait = defaultdict(Histogram)
+        self.render_time = defaultdict(Histogram)
+
+    def _limit(self, tenant: str, plan: str) -> int:
+        return int(TENANT_CONCURRENCY.get(tenant) or PLAN_CONCURRENCY.get(plan) or QR_DEFAULT_TENANT_CONCURRENCY)
+
+    def _metrics_label(self, tenant: str) -> str:
+        # /metrics public (sans METRICS_TOKEN) : publier une empreinte, pas l'identifiant du client
+        if not os.environ.get("METRICS_TOKEN"):
+            tenant = "t-" + hashlib.sha256(tenant.encode()).hexdigest()[:12]
+        # Borner la cardinalité des métriques par locataire
+        if tenant in self.queue_wait or len(self.queue_wait) < QR_METRICS_MAX_TENANTS:
+            return tenant
+        return "other"
+
+    def _dispatch(self):
+        blocked = []
+        while self.queue and self.running < self.concurrency:
+            item = heapq.heappop(self.queue)
+            _, _, start, tenant, limit, future = item
+            if future.done():
+                continue
+            state = self.tenants[tenant]
+            if state.running >= limit:
+                blocked.append(item)
+                continue
+            state.queued -= 1
+            state.running += 1
+            self.running += 1
+            self.virtual_time = max(self.virtual_time, start)
+            future.set_result(True)
+        for item in blocked:
+            heapq.heappush(self.queue, item)
+
+    async def acquire(self, tenant: str, plan: str, cost: int):
+        state = self.tenants.get(tenant)
+        if state is None:
+            state = self.tenants[tenant] = TenantState()
+        limit = self._limit(tenant, plan)
+        if state.queued >= self.max_queue:
+            self.rejected["tenant_queue_full"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Trop de rendus en attente pour ce compte, ralentissez.",
+                headers={"Retry-After": str(QR_RETRY_AFTER)},
+            )
+        start = max(self.virtual_time, state.finish)
+        state.finish = start + cost / PLAN_WEIGHTS.get(plan, 1.0)
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.queue, (state.finish, self.sequence, start, tenant, limit, future))
+        state.queued += 1
+        self._dispatch()
+        if future.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return
+            future.cancel()
+            state.queued -= 1
+            self._forget_if_idle(tenant, state)
+            self.rejected["timeout"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Serveur surchargé, réessayez plus tard.",
+                headers={"Retry-After": str(QR_RETRY_AFTER)},
+            )
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(tenant)
+            else:
+                future.cancel()
+                state.queued -= 1
+                self._forget_if_idle(tenant, state)
+            raise
+
+    def _forget_if_idle(self, tenant: str, state: TenantState):
+        """
+        Oublie un locataire sans rendu en cours ni en attente : l'en-tête qui l'identifie
+        vient du client, l'état ne doit pas grandir avec chaque identifiant vu. À son
+        retour, il repart du temps virtuel courant comme un nouveau locataire.
+        """
+        if not state.running and not state.queued and self.tenants.get(tenant) is state:
+            del self.tenants[tenant]
+
+    def release(self, tenant: str):
+        state = self.tenants[tenant]
+        state.running -= 1
+        self.running -= 1
+        self._forget_if_idle(tenant, state)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, plan: str, cost: int):
+        label = self._metrics_label(tenant)
+        queued_at = time.perf_counter()
+        await self.acquire(tenant, plan, cost)
+        started_at = time.perf_counter()
+        self.queue_wait[label].observe(started_at - queued_at)
+        try:
+            yield
+        finally:
+            self.render_time[label].observe(time.perf_counter() - started_at)
+            self.release(tenant)
+
+SCHEDULER = FairScheduler(QR_RENDER_CONCURRENCY, QR_ADMISSION_TIMEOUT, QR_TENANT_MAX_QUEUE)
+
+@asynccontextmanager
+async def render_slot(cost: int):
+    """Réserve un créneau de rendu : ordonnancement par locataire puis budget de pixels."""
+    tenant, plan = CURRENT_TENANT.get()
+    async with SCHEDULER.slot(tenant, plan, cost):
+        async with ADMISSION.admit(cost):
+            yield
 
 # Utilitaires graphiques
-MODULE_STYLES = {
-    "square": SquareModuleDrawer(),
-    "rounded": RoundedModuleDrawer(),
-    "gapped": GappedSquareModuleDrawer(),
-    "circle": CircleModuleDrawer(),
-    "vertical": VerticalBarsDrawer(),
-    "horizontal": HorizontalBarsDrawer(),
-}
+class LazyRegistry(Mapping):
+    """
+    Dictionnaire nom -> classe qrcode dont les clés sont connues sans import :
+    la validation des paramètres ne charge rien, le module n'est importé qu'au premier accès.
+    """
 
-GRADIENTS = {
-    "solid": SolidFillColorMask,
-    "radial": RadialGradiantColorMask,
-    "horizontal": HorizontalGradiantColorMask,
-    "vertical": VerticalGradiantColorMask,
-}
+    def __init__(self, module: str, names: dict, instantiate: bool = False):
+        self.module = module
+        self.names = names
+        self.instantiate = instantiate
+        self.loaded = {}
+
+    def __getitem__(self, key):
+        value = self.loaded.get(key)
+        if value is None:
+            cls = getattr(importlib.import_module(self.module), self.names[key])
+            value = self.loaded[key] = cls() if self.instantiate else cls
+        return value
+
+    def __contains__(self, key):
+        return key in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+MODULE_STYLES = LazyRegistry("qrcode.image.styles.moduledrawers", {
+    "square": "SquareModuleDrawer",
+    "rounded": "RoundedModuleDrawer",
+    "gapped": "GappedSquareModuleDrawer",
+    "circle": "CircleModuleDrawer",
+    "vertical": "VerticalBarsDrawer",
+    "horizontal": "HorizontalBarsDrawer",
+}, instantiate=True)
+
+GRADIENTS = LazyRegistry("qrcode.image.styles.colormasks", {
+    "solid": "SolidFillColorMask",
+    "radial": "RadialGradiantColorMask",
+    "horizontal": "HorizontalGradiantColorMask",
+    "vertical": "VerticalGradiantColorMask",
+})
 
 def safe_hex_to_rgb(hex_color: str, alpha: Optional[int] = None, force_rgba: bool = False):
     if not hex_color:
@@ -101,21 +701,671 @@ def safe_hex_to_rgb(hex_color: str, alpha: Optional[int] = None, force_rgba: boo
     else:
         return (0, 0, 0)
 
-def add_caption(img, caption, size):
-    draw = ImageDraw.Draw(img)
-    font_size = int(size * 0.06)
+# --- AJOUT : Niveau de correction d'erreur et segmentation optimale ---
+# Indicateurs de la norme (ISO/IEC 18004), identiques aux constantes ERROR_CORRECT_* de qrcode
+ERROR_CORRECTION_LEVELS = {
+    "L": 1,
+    "M": 0,
+    "Q": 3,
+    "H": 2,
+}
+
+# Niveau utilisé par "auto" sans logo : M reste lisible après impression
+# tout en produisant une version bien plus petite que H pour les URLs longues.
+AUTO_ERROR_CORRECTION = "M"
+
+def resolve_error_correction(level: str, has_logo: bool = False) -> int:
+    """Convertit L/M/Q/H/auto en constante qrcode ("auto" = H seulement avec un logo)."""
+    level = str(level or "auto").strip().upper()
+    if level == "AUTO":
+        level = "H" if has_logo else AUTO_ERROR_CORRECTION
+    if level not in ERROR_CORRECTION_LEVELS:
+        raise HTTPException(status_code=400, detail="error_correction doit valoir L, M, Q, H ou auto.")
+    return ERROR_CORRECTION_LEVELS[level]
+
+# Groupes de versions partageant la même taille des champs de longueur
+_VERSION_GROUPS = ((1, 9), (10, 26), (27, 40))
+# Indicateurs de mode de la norme, identiques à qrcode.util.MODE_NUMBER/MODE_ALPHA_NUM/MODE_8BIT_BYTE
+_MODE_NUMBER, _MODE_ALPHA_NUM, _MODE_8BIT_BYTE = 1, 2, 4
+_SEGMENT_MODES = (_MODE_NUMBER, _MODE_ALPHA_NUM, _MODE_8BIT_BYTE)
+# Coût par caractère en sixièmes de bit (10/3, 11/2 et 8 bits)
+_CHAR_COST = {_MODE_NUMBER: 20, _MODE_ALPHA_NUM: 33, _MODE_8BIT_BYTE: 48}
+_NUMERIC_CHARS = frozenset(b"0123456789")
+_ALPHA_NUM_CHARS = frozenset(b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:")
+
+def _segment_bits(mode: int, length: int, mode_sizes: dict) -> int:
+    """Nombre exact de bits d'un segment (en-tête compris)."""
+    if mode == _MODE_NUMBER:
+        data_bits = 10 * (length // 3) + (0, 4, 7)[length % 3]
+    elif mode == _MODE_ALPHA_NUM:
+        data_bits = 11 * (length // 2) + 6 * (length % 2)
+    else:
+        data_bits = 8 * length
+    return 4 + mode_sizes[mode] + data_bits
+
+def _split_segments(data: bytes, mode_sizes: dict) -> list:
+    """
+    Découpe les données en segments numérique/alphanumérique/octet de coût minimal
+    (programmation dynamique sur les modes, en sixièmes de bit).
+    """
+    head = {m: (4 + mode_sizes[m]) * 6 for m in _SEGMENT_MODES}
+    prev_costs = dict(head)
+    char_modes = []
+    for byte in data:
+        allowed = {
+            _MODE_NUMBER: byte in _NUMERIC_CHARS,
+            _MODE_ALPHA_NUM: byte in _ALPHA_NUM_CHARS,
+            _MODE_8BIT_BYTE: True,
+        }
+        encoded = {m: prev_costs[m] + _CHAR_COST[m] for m in _SEGMENT_MODES if allowed[m]}
+        cur_costs = dict(encoded)
+        modes = {m: m for m in encoded}
+        # Changer de mode après ce caractère si c'est moins coûteux
+        for m in _SEGMENT_MODES:
+            for other, cost in encoded.items():
+                switched = (cost + 5) // 6 * 6 + head[m]
+                if m not in cur_costs or switched < cur_costs[m]:
+                    cur_costs[m] = switched
+                    modes[m] = other
+        char_modes.append(modes)
+        prev_costs = cur_costs
+
+    # Remonter le chemin de coût minimal
+    mode = min(prev_costs, key=lambda m: ((prev_costs[m] + 5) // 6, -m))
+    path = []
+    for modes in reversed(char_modes):
+        mode = modes[mode]
+        path.append(mode)
+    path.reverse()
+
+    segments = []
+    start = 0
+    for i in range(1, len(path) + 1):
+        if i == len(path) or path[i] != path[start]:
+            segments.append((path[start], data[start:i]))
+            start = i
+    return segments
+
+@lru_cache(maxsize=1024)
+def optimal_segments(data: str, error_correction: int) -> tuple:
+    """Retourne les segments QRData permettant la plus petite version possible."""
+    from qrcode import util as qr_util
+    raw = qr_util.to_bytestring(data)
+    if not raw:
+        return (qr_util.QRData(raw, mode=qr_util.MODE_8BIT_BYTE, check_data=False),)
+    limits = qr_util.BIT_LIMIT_TABLE[error_correction]
+    best = None
+    for first, last in _VERSION_GROUPS:
+        mode_sizes = qr_util.mode_sizes_for_version(first)
+        segments = _split_segments(raw, mode_sizes)
+        bits = sum(_segment_bits(mode, len(chunk), mode_sizes) for mode, chunk in segments)
+        version = bisect_left(limits, bits, first)
+        if version <= last:
+            best = segments
+            break
+    if best is None:
+        # Trop long pour toute version : make_qr le signale par une erreur 413
+        best = [(qr_util.MODE_8BIT_BYTE, raw)]
+    return tuple(qr_util.QRData(chunk, mode=mode, check_data=False) for mode, chunk in best)
+
+def make_qr(data: str, error_correction: str = "auto", has_logo: bool = False) -> "qrcode.QRCode":
+    """Construit un QRCode à la plus petite version possible pour le niveau demandé."""
+    import qrcode
+    from qrcode.exceptions import DataOverflowError
+    level = resolve_error_correction(error_correction, has_logo)
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=level,
+        box_size=10,
+        border=4,
+    )
+    for segment in optimal_segments(str(data), level):
+        qr.add_data(segment)
+    try:
+        qr.make(fit=True)
+    except (DataOverflowError, ValueError):
+        # Selon la version de qrcode : DataOverflowError ou ValueError("Invalid version (was 41...)")
+        raise HTTPException(status_code=413, detail="Données trop longues pour un QR code à ce niveau de correction d'erreur.")
+    return qr
+
+# --- AJOUT : Registre de logos réutilisables (adressés par contenu) ---
+LOGO_ASSET_DIR = os.environ.get("LOGO_ASSET_DIR", "logo_assets")
+LOGO_MAX_BYTES = int(os.environ.get("LOGO_MAX_BYTES", str(5 * 1024 * 1024)))
+LOGO_MEMORY_ITEMS = int(os.environ.get("LOGO_MEMORY_ITEMS", "256"))
+LOGO_CHUNK_SIZE = 64 * 1024
+LOGO_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+LOGO_MAX_PIXELS = int(os.environ.get("LOGO_MAX_PIXELS", str(50_000_000)))
+# Disque occupé par les logos et leurs variantes (les moins récemment utilisés sont supprimés au-delà)
+LOGO_DISK_MAX_BYTES = int(os.environ.get("LOGO_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Logos conservés par locataire : au-delà, le moins récemment envoyé est libéré
+LOGO_MAX_PER_TENANT = int(os.environ.get("LOGO_MAX_PER_TENANT", "100"))
+# Corps multipart/formulaire : un logo plus les champs et l'enveloppe multipart
+QR_MAX_FORM_BYTES = int(os.environ.get("QR_MAX_FORM_BYTES", str(LOGO_MAX_BYTES + 64 * 1024)))
+FORM_CONTENT_TYPES = (b"multipart/form-data", b"application/x-www-form-urlencoded")
+
+class FormSizeLimitMiddleware:
+    """
+    Middleware ASGI bornant la taille des formulaires avant leur analyse : FastAPI lit
+    tout le corps multipart (et l'écrit sur disque) avant d'appeler l'endpoint, les
+    limites vérifiées dans l'endpoint arriveraient donc trop tard. Content-Length trop
+    grand : 413 sans lire le corps ; corps sans longueur (chunked) : 413 dès le dépassement.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").encode("latin-1").lower().startswith(FORM_CONTENT_TYPES):
+            return await self.app(scope, receive, send)
+        too_large = JSONResponse(
+            {"detail": f"Requête trop volumineuse (maximum {self.max_bytes} octets)."}, status_code=413,
+        )
+        length = headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await too_large(scope, receive, send)
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Relevée telle quelle par FastAPI pendant l'analyse du formulaire
+                    raise HTTPException(status_code=413, detail=f"Requête trop volumineuse (maximum {self.max_bytes} octets).")
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+app.add_middleware(FormSizeLimitMiddleware, max_bytes=QR_MAX_FORM_BYTES)
+
+def decode_logo(source, logo_size: int) -> Image.Image:
+    """
+    Décode un logo directement à la taille cible (appel bloquant, hors boucle d'événements).
+    Les dimensions sont contrôlées avant tout décodage (bombes de décompression),
+    les JPEG sont décodés à échelle réduite (mode draft) et les autres formats
+    réduits par facteur entier avant le redimensionnement final.
+    """
+    try:
+        img = Image.open(source)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Le logo n'est pas une image valide.")
+    width, height = img.size
+    if width * height > LOGO_MAX_PIXELS:
+        raise HTTPException(status_code=413, detail=f"Logo trop grand ({width}x{height} pixels).")
+    try:
+        # Pour un JPEG, le décodeur saute directement à 1/2, 1/4 ou 1/8 de la résolution
+        img.draft("RGB", (logo_size, logo_size))
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA")
+        # reducing_gap : réduction rapide par facteur entier, puis filtrage de qualité
+        img = img.resize((logo_size, logo_size), reducing_gap=3.0)
+        return img.convert("RGBA")
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise HTTPException(status_code=400, detail="Le logo n'a pas pu être décodé.")
+
+async def fetch_logo(logo_url: str, logo_size: int) -> Optional[Image.Image]:
+    """Télécharge un logo distant (taille bornée) et le décode hors de la boucle ; None en cas d'échec."""
+    import httpx
+    try:
+        async with httpx.AsyncClient() as client:
+            async with client.stream("GET", logo_url) as resp:
+                resp.raise_for_status()
+                content = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    content.extend(chunk)
+                    if len(content) > LOGO_MAX_BYTES:
+                        return None
+        return await run_in_threadpool(decode_logo, io.BytesIO(bytes(content)), logo_size)
+    except Exception:
+        return None
+
+class LogoRegistry:
+    """
+    Stocke les logos sur disque sous leur SHA-256 et garde en mémoire (LRU)
+    et sur disque les variantes déjà décodées et redimensionnées.
+    Le disque est borné (disk_max_bytes, fichiers les moins récemment utilisés
+    supprimés) et chaque locataire conserve au plus max_per_tenant logos.
+    Les originaux encore référencés par un QR dynamique ou un style enregistré
+    ne sont jamais supprimés : leur image doit pouvoir être régénérée.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, memory_items: int,
+                 disk_max_bytes: int = LOGO_DISK_MAX_BYTES, max_per_tenant: int = LOGO_MAX_PER_TENANT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.max_per_tenant = max_per_tenant
+        self.variants = OrderedDict()  # (logo_id, taille) -> Image RGBA
+        self.files = None  # chemin -> octets, du moins au plus récemment utilisé (chargé au premier usage)
+        self.disk_bytes = 0
+        self.owners = defaultdict(OrderedDict)  # locataire -> logo_id -> None, par ordre d'envoi
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self.evictions = 0
+
+    def _disk_index(self) -> OrderedDict:
+        """Index LRU des fichiers présents, initialisé depuis le disque (ordre des mtime). Sous self.lock."""
+        if self.files is None:
+            found = []
+            for folder in (self.directory, os.path.join(self.directory, "variants")):
+                try:
+                    entries = list(os.scandir(folder))
+                except FileNotFoundError:
+                    continue
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith((".img", ".png")):
+                        stat = entry.stat()
+                        found.append((stat.st_mtime, entry.path, stat.st_size))
+            self.files = OrderedDict((path, size) for _, path, size in sorted(found))
+            self.disk_bytes = sum(self.files.values())
+        return self.files
+
+    def _touch(self, path: str):
+        with self.lock:
+            files = self._disk_index()
+            if path in files:
+                files.move_to_end(path)
+
+    def _pinned(self) -> set:
+        """Chemins des originaux référencés par DYNAMIC_QR_DB ou STYLE_PRESETS."""
+        # list() copie d'un bloc : les dictionnaires peuvent changer depuis la boucle d'événements
+        logo_ids = {record.get("style", {}).get("logo_id") for record in list(DYNAMIC_QR_DB.values())}
+        logo_ids.update(preset["definition"].get("logo_id") for preset in list(STYLE_PRESETS.values()))
+        return {self.path(logo_id) for logo_id in logo_ids if logo_id}
+
+    def _remove_file(self, path: str):
+        """Retire un fichier de l'index et du disque. Sous self.lock."""
+        self.disk_bytes -= self._disk_index().pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _add_file(self, path: str, size: int):
+        """Enregistre un fichier écrit puis supprime les plus anciens au-delà du budget disque."""
+        with self.lock:
+            files = self._disk_index()
+            self.disk_bytes += size - files.pop(path, 0)
+            files[path] = size
+            if self.disk_bytes <= self.disk_max_bytes:
+                return
+            pinned = self._pinned()
+            pinned.add(path)
+            for candidate in [candidate for candidate in files if candidate not in pinned]:
+                if self.disk_bytes <= self.disk_max_bytes:
+                    break
+                self._remove_file(candidate)
+                self.evictions += 1
+
+    def _claim(self, tenant: str, logo_id: str):
+        """Attribue le logo au locataire et libère son plus ancien logo au-delà du quota."""
+        with self.lock:
+            owned = self.owners[tenant]
+            owned[logo_id] = None
+            owned.move_to_end(logo_id)
+            pinned = None
+            while len(owned) > self.max_per_tenant:
+                released, _ = owned.popitem(last=False)
+                # Contenu partagé : le fichier reste tant qu'un autre locataire le détient
+                if any(released in other for other in self.owners.values()):
+                    continue
+                if pinned is None:
+                    pinned = self._pinned()
+                if self.path(released) not in pinned:
+                    self._remove_file(self.path(released))
+                    self.evictions += 1
+
+    def path(self, logo_id: str) -> str:
+        return os.path.join(self.directory, f"{logo_id}.img")
+
+    def variant_path(self, logo_id: str, logo_size: int) -> str:
+        return os.path.join(self.directory, "variants", f"{logo_id}-{logo_size}.png")
+
+    def check(self, logo_id: str) -> str:
+        """Valide l'identifiant (pas de chemin arbitraire) et vérifie que le logo existe."""
+        logo_id = str(logo_id or "").lower()
+        if not LOGO_ID_PATTERN.match(logo_id) or not os.path.exists(self.path(logo_id)):
+            raise HTTPException(status_code=404, detail="Logo inconnu : utilisez l'identifiant renvoyé par /upload-image.")
+        self._touch(self.path(logo_id))
+        return logo_id
+
+    async def store_upload(self, upload: UploadFile) -> tuple:
+        """Enregistre un upload par morceaux (taille bornée) ; retourne (logo_id, octets)."""
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        total = 0
+        tmp_path = os.path.join(self.directory, f".upload-{uuid.uuid4().hex}")
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await upload.read(LOGO_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    total += len(chunk)
+                    if total > self.max_bytes:
+                        raise HTTPException(status_code=413, detail=f"Logo trop volumineux (maximum {self.max_bytes} octets).")
+                    digest.update(chunk)
+                    f.write(chunk)
+            try:
+                with Image.open(tmp_path) as probe:
+                    width, height = probe.size
+                    probe.verify()
+            except Exception:
+                raise HTTPException(status_code=400, detail="Le fichier envoyé n'est pas une image valide.")
+            if width * height > LOGO_MAX_PIXELS:
+                raise HTTPException(status_code=413, detail=f"Logo trop grand ({width}x{height} pixels).")
+            logo_id = digest.hexdigest()
+            os.replace(tmp_path, self.path(logo_id))
+            self._add_file(self.path(logo_id), total)
+            self._claim(CURRENT_TENANT.get()[0], logo_id)
+            return logo_id, total
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def variant(self, logo_id: str, logo_size: int) -> Image.Image:
+        """Logo RGBA à la taille demandée : mémoire, puis disque, puis décodage de l'original."""
+        key = (logo_id, logo_size)
+        with self.lock:
+            img = self.variants.get(key)
+            if img is not None:
+                self.variants.move_to_end(key)
+                self.stats["hits"] += 1
+                return img
+        variant_path = self.variant_path(logo_id, logo_size)
+        try:
+            img = Image.open(variant_path).convert("RGBA")
+            self.stats["disk_hits"] += 1
+            self._touch(variant_path)
+        except FileNotFoundError:
+            self.stats["misses"] += 1
+            try:
+                img = decode_logo(self.path(logo_id), logo_size)
+            except HTTPException:
+                if not os.path.exists(self.path(logo_id)):
+                    # Supprimé entre check() et le rendu (quota ou budget disque)
+                    raise HTTPException(status_code=404, detail="Logo inconnu : utilisez l'identifiant renvoyé par /upload-image.")
+                raise
+            os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+            tmp_path = f"{variant_path}.{uuid.uuid4().hex}.tmp"
+            img.save(tmp_path, format="PNG")
+            os.replace(tmp_path, variant_path)
+            self._add_file(variant_path, os.path.getsize(variant_path))
+        with self.lock:
+            self.variants[key] = img
+            while len(self.variants) > self.memory_items:
+                self.variants.popitem(last=False)
+        return img
+
+LOGOS = LogoRegistry(LOGO_ASSET_DIR, LOGO_MAX_BYTES, LOGO_MEMORY_ITEMS)
+
+# --- AJOUT : Polices et bandeaux de légende mis en cache ---
+# QR_CAPTION_FONT : chemin d'une police TrueType/OpenType. À défaut, première police
+# système disponible parmi CAPTION_FONT_CANDIDATES (accents compris), puis police intégrée à Pillow.
+# QR_CAPTION_FONTS : polices nommées utilisables par les styles, ex. "marque=/srv/fonts/marque.ttf".
+CAPTION_FONT_PATH = os.environ.get("QR_CAPTION_FONT", "")
+CAPTION_FONT_CANDIDATES = ("DejaVuSans.ttf", "arial.ttf", "LiberationSans-Regular.ttf")
+CAPTION_CACHE_SIZE = int(os.environ.get("QR_CAPTION_CACHE_SIZE", "512"))
+CAPTION_FONTS = dict(
+    item.strip().split("=", 1) for item in os.environ.get("QR_CAPTION_FONTS", "").split(",") if "=" in item
+)
+
+@lru_cache(maxsize=16)
+def _caption_font_bytes(font: str = "") -> Optional[bytes]:
+    """Localise et lit une seule fois le fichier de police de légende."""
+    from PIL import ImageFont
+    path = CAPTION_FONTS.get(font) or CAPTION_FONT_PATH
+    if not path:
+        for candidate in CAPTION_FONT_CANDIDATES:
+            try:
+                # truetype() cherche aussi dans les répertoires de polices du système
+                path = ImageFont.truetype(candidate, 10).path
+                break
+            except OSError:
+                continue
+    if not path:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+@lru_cache(maxsize=64)
+def get_caption_font(font_size: int, font: str = ""):
+    """Police de légende à la taille demandée (chargée une fois par taille)."""
+    from PIL import ImageFont
+    font_bytes = _caption_font_bytes(font)
+    if font_bytes is not None:
+        return ImageFont.truetype(io.BytesIO(font_bytes), font_size)
     try:
-        font = ImageFont.truetype("arial.ttf", font_size)
-    except:
-        font = ImageFont.load_default()
-    bbox = draw.textbbox((0, 0), caption, font=font)
+        # Pillow >= 10.1 embarque une police vectorielle redimensionnable
+        return ImageFont.load_default(size=font_size)
+    except (TypeError, ImportError):
+        return ImageFont.load_default()
+
+@lru_cache(maxsize=CAPTION_CACHE_SIZE)
+def render_caption_strip(caption: str, font_size: int, width: int, color: tuple, font: str = "") -> Image.Image:
+    """Bandeau RGBA transparent contenant la légende centrée (partagé, ne pas modifier)."""
+    from PIL import ImageDraw
+    font_obj = get_caption_font(font_size, font)
+    bbox = font_obj.getbbox(caption)
     w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-    new_img = Image.new("RGBA", (img.width, img.height + h + 10), (255,255,255,0))
-    new_img.paste(img, (0,0))
-    draw = ImageDraw.Draw(new_img)
-    draw.text(((img.width-w)//2, img.height+5), caption, fill=(0,0,0,255), font=font)
+    strip = Image.new("RGBA", (width, h + 10), (255, 255, 255, 0))
+    # Compenser le décalage de la boîte englobante pour garder 5 px de marge en haut et en bas
+    ImageDraw.Draw(strip).text(((width - w) // 2 - bbox[0], 5 - bbox[1]), caption, fill=color, font=font_obj)
+    return strip
+
+def add_caption(img, caption, size, color=(0, 0, 0, 255), font=""):
+    strip = render_caption_strip(caption, max(1, int(size * 0.06)), img.width, tuple(color), font)
+    # Le canevas final est alloué une seule fois, à la hauteur définitive
+    new_img = Image.new("RGBA", (img.width, img.height + strip.height), (255, 255, 255, 0))
+    new_img.paste(img, (0, 0))
+    new_img.paste(strip, (0, img.height))
     return new_img
 
+# --- AJOUT : Styles compilés et préréglages nommés (/styles) ---
+QR_GRADIENT_CACHE_BYTES = int(os.environ.get("QR_GRADIENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+QR_MAX_STYLES_PER_TENANT = int(os.environ.get("QR_MAX_STYLES_PER_TENANT", "100"))
+STYLE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+HEX_COLOR_PATTERN = re.compile(r"^#?[0-9A-Fa-f]{6}$")
+OUTPUT_FORMATS = ("png", "svg", "pdf", "webp")
+
+_GRADIENT_FIELDS = OrderedDict()  # (dégradé, début, fin, taille) -> Image RGBA partagée
+_GRADIENT_FIELDS_LOCK = threading.Lock()
+_GRADIENT_FIELDS_BYTES = [0]
+
+def gradient_field(gradient_type: str, start: tuple, end: tuple, size: int) -> Image.Image:
+    """
+    Champ de couleur du dégradé à la taille finale (partagé, ne pas modifier).
+    Reproduit les masques de qrcode (radial : centre -> coins, horizontal : gauche -> droite,
+    vertical : haut -> bas) avec les rampes natives de Pillow au lieu d'une boucle par pixel.
+    """
+    from PIL import ImageOps
+    key = (gradient_type, start, end, size)
+    with _GRADIENT_FIELDS_LOCK:
+        field = _GRADIENT_FIELDS.get(key)
+        if field is not None:
+            _GRADIENT_FIELDS.move_to_end(key)
+            return field
+    if gradient_type == "radial":
+        # 0 au centre, 255 aux coins, comme la distance normalisée de RadialGradiantColorMask
+        ramp = Image.radial_gradient("L")
+    else:
+        ramp = Image.linear_gradient("L")
+        if gradient_type == "horizontal":
+            ramp = ramp.transpose(Image.Transpose.ROTATE_90)
+    ramp = ramp.resize((size, size), resample=Image.BILINEAR)
+    field = ImageOps.colorize(ramp, start, end).convert("RGBA")
+    with _GRADIENT_FIELDS_LOCK:
+        if key not in _GRADIENT_FIELDS:
+            _GRADIENT_FIELDS[key] = field
+            _GRADIENT_FIELDS_BYTES[0] += size * size * 4
+        while _GRADIENT_FIELDS_BYTES[0] > QR_GRADIENT_CACHE_BYTES and len(_GRADIENT_FIELDS) > 1:
+            (_, _, _, evicted), _ = _GRADIENT_FIELDS.popitem(last=False)
+            _GRADIENT_FIELDS_BYTES[0] -= evicted * evicted * 4
+    return field
+
+@lru_cache(maxsize=1)
+def eye_layer_drawer():
+    """Dessinateur partagé qui laisse vides les trois motifs de position : la couche des yeux les pose ensuite d'un bloc."""
+    from qrcode.image.styles.moduledrawers.base import QRModuleDrawer
+
+    class EyeLayerDrawer(QRModuleDrawer):
+        needs_neighbors = False
+
+        def drawrect(self, box, is_active):
+            pass
+
+    return EyeLayerDrawer()
+
+@lru_cache(maxsize=16)
+def eye_sprite(box_size: int) -> Image.Image:
+    """
+    Masque L d'un motif de position (7x7 modules : anneau, séparation, carré central de 3x3),
+    identique aux carrés du dessinateur d'yeux par défaut de qrcode. Partagé, ne pas modifier.
+    """
+    from PIL import ImageDraw
+    sprite = Image.new("L", (7 * box_size, 7 * box_size), 255)
+    draw = ImageDraw.Draw(sprite)
+    draw.rectangle((box_size, box_size, 6 * box_size - 1, 6 * box_size - 1), fill=0)
+    draw.rectangle((2 * box_size, 2 * box_size, 5 * box_size - 1, 5 * box_size - 1), fill=255)
+    return sprite
+
+def eye_positions(qr) -> tuple:
+    """Coins supérieurs gauches (en pixels) des yeux haut-gauche, haut-droite et bas-gauche."""
+    near = qr.border * qr.box_size
+    far = (qr.border + qr.modules_count - 7) * qr.box_size
+    return ((near, near), (far, near), (near, far))
+
+class CompiledStyle:
+    """
+    Style prêt au rendu : couleurs déjà analysées, dessinateur de modules par thread et
+    champs de dégradé partagés. Les modules sont dessinés en noir sur blanc (chemin rapide
+    de qrcode, sans masque de couleur pixel par pixel) puis colorisés par composition.
+    """
+
+    def __init__(self, module_style: str, gradient_type: str, front: tuple, gradient_end: tuple,
+                 back: tuple, eye_color: Optional[tuple] = None):
+        self.module_style = module_style if module_style in MODULE_STYLES else "square"
+        self.gradient_type = gradient_type if gradient_type in GRADIENTS else "solid"
+        self.front = front
+        self.gradient_end = gradient_end
+        self.back = back
+        self.eye_color = eye_color
+        self.local = threading.local()
+
+    def module_drawer(self):
+        """Dessinateur propre au thread : qrcode y attache l'image en cours de dessin."""
+        drawer = getattr(self.local, "drawer", None)
+        if drawer is None:
+            drawer = self.local.drawer = type(MODULE_STYLES[self.module_style])()
+        return drawer
+
+    def on_background(self, back: tuple) -> "CompiledStyle":
+        """Même style sur un autre fond (fond blanc forcé par la transparence)."""
+        if back == self.back:
+            return self
+        return compile_style(self.module_style, self.gradient_type, self.front, self.gradient_end, back, self.eye_color)
+
+    def render(self, qr, size: int) -> Image.Image:
+        """Image RGBA du QR code à la taille finale."""
+        from PIL import ImageOps
+        from qrcode.image.styledpil import StyledPilImage
+        modules = qr.make_image(image_factory=StyledPilImage, module_drawer=self.module_drawer(),
+                                eye_drawer=eye_layer_drawer())
+        # Masque L : 255 sur les modules sombres, niveaux intermédiaires sur les bords lissés
+        mask = ImageOps.invert(modules.convert("L"))
+        # Couche des yeux : trois collages du sprite au lieu de 147 modules dessinés un par un
+        sprite = eye_sprite(qr.box_size)
+        eye_mask = mask if self.eye_color is None else Image.new("L", mask.size, 0)
+        for position in eye_positions(qr):
+            eye_mask.paste(sprite, position)
+        mask = mask.resize((size, size), resample=Image.NEAREST)
+        img = Image.new("RGBA", (size, size), (*self.back, 255))
+        if self.gradient_type == "solid":
+            img.paste((*self.front, 255), (0, 0, size, size), mask)
+        else:
+            img.paste(gradient_field(self.gradient_type, self.front, self.gradient_end, size), (0, 0), mask)
+        if self.eye_color is not None:
+            eye_mask = eye_mask.resize((size, size), resample=Image.NEAREST)
+            img.paste((*self.eye_color, 255), (0, 0, size, size), eye_mask)
+        return img
+
+@lru_cache(maxsize=256)
+def compile_style(module_style: str, gradient_type: str, front: tuple, gradient_end: tuple,
+                  back: tuple, eye_color: Optional[tuple] = None) -> CompiledStyle:
+    return CompiledStyle(module_style, gradient_type, front, gradient_end, back, eye_color)
+
+@lru_cache(maxsize=256)
+def compile_request_style(module_style: str, gradient_type: str, start_color: str, bg_color: str,
+                          eye_color: str = "") -> CompiledStyle:
+    """
+    Style des paramètres de /generate-qr : dégradé de start_color vers bg_color sur fond
+    blanc, ou start_color sur bg_color en uni (comportement historique de generate_qr_core).
+    Sans eye_color, les yeux prennent la couleur des modules.
+    """
+    back = safe_hex_to_rgb(bg_color)
+    is_gradient = gradient_type in GRADIENTS and gradient_type != "solid"
+    return compile_style(module_style, gradient_type, safe_hex_to_rgb(start_color), back,
+                         (255, 255, 255) if is_gradient else back,
+                         safe_hex_to_rgb(eye_color) if eye_color else None)
+
+STYLE_PRESETS = {}  # (locataire, style_id) -> {"definition", "digest", "compiled"}
+
+def register_style(style_id: str, module_style: str = "square", gradient_type: str = "solid",
+                   start_color: str = "#000000", end_color: str = "#FFFFFF", bg_color: str = "#FFFFFF",
+                   eye_color: str = "", logo_id: str = "", caption_font: str = "", file: str = "png") -> dict:
+    """Valide et compile un préréglage pour le locataire courant (le remplace s'il existe)."""
+    if not STYLE_ID_PATTERN.match(str(style_id or "")):
+        raise HTTPException(status_code=400, detail="Identifiant de style invalide (lettres, chiffres, - et _, 64 caractères maximum).")
+    if module_style not in MODULE_STYLES:
+        raise HTTPException(status_code=400, detail=f"module_style invalide : {', '.join(MODULE_STYLES)}.")
+    if gradient_type not in GRADIENTS:
+        raise HTTPException(status_code=400, detail=f"gradient_type invalide : {', '.join(GRADIENTS)}.")
+    for color in (start_color, end_color, bg_color) + ((eye_color,) if eye_color else ()):
+        if not HEX_COLOR_PATTERN.match(str(color)):
+            raise HTTPException(status_code=400, detail=f"Couleur invalide : {color} (format #RRGGBB).")
+    if logo_id:
+        logo_id = LOGOS.check(logo_id)
+    if caption_font and caption_font not in CAPTION_FONTS:
+        raise HTTPException(status_code=400, detail="Police de légende inconnue (voir QR_CAPTION_FONTS).")
+    file = str(file or "png").lower()
+    if file not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format invalide : {', '.join(OUTPUT_FORMATS)}.")
+
+    tenant, _ = CURRENT_TENANT.get()
+    key = (tenant, style_id)
+    if key not in STYLE_PRESETS and sum(1 for t, _ in STYLE_PRESETS if t == tenant) >= QR_MAX_STYLES_PER_TENANT:
+        raise HTTPException(status_code=409, detail=f"Nombre maximum de styles atteint ({QR_MAX_STYLES_PER_TENANT}).")
+    definition = {
+        "style_id": style_id, "module_style": module_style, "gradient_type": gradient_type,
+        "start_color": start_color, "end_color": end_color, "bg_color": bg_color, "eye_color": eye_color,
+        "logo_id": logo_id, "caption_font": caption_font, "file": file,
+    }
+    STYLE_PRESETS[key] = {
+        "definition": definition,
+        # Empreinte du contenu : un style redéfini ne réutilise pas les rendus en cache de l'ancien
+        "digest": hashlib.md5(json.dumps(definition, sort_keys=True).encode()).hexdigest(),
+        "compiled": compile_style(
+            module_style, gradient_type, safe_hex_to_rgb(start_color), safe_hex_to_rgb(end_color),
+            safe_hex_to_rgb(bg_color), safe_hex_to_rgb(eye_color) if eye_color else None,
+        ),
+    }
+    return definition
+
+def get_style_preset(style_id: str) -> dict:
+    tenant, _ = CURRENT_TENANT.get()
+    preset = STYLE_PRESETS.get((tenant, str(style_id)))
+    if preset is None:
+        raise HTTPException(status_code=404, detail="Style inconnu : enregistrez-le avec POST /styles.")
+    return preset
+
+@profiled
 async def generate_qr_core(
     data: str,
     file: str = "png",
@@ -129,26 +1379,81 @@ async def generate_qr_core(
     end_color: str = "#FFFFFF",
     caption: str = "",
     logo_url: str = "",
-    logo_img: Optional[Image.Image] = None
+    logo_img: Optional[Image.Image] = None,
+    error_correction: str = "auto",
+    logo_id: str = "",
+    style_id: str = ""
 ) -> StreamingResponse:
     """
     Fonction centrale pour générer un QR code avec tous les paramètres.
     Cette fonction extrait la logique commune entre GET et POST.
+    Avec style_id, le préréglage compilé remplace les paramètres de style.
     """
     # Nettoyer le cache périodiquement
     cleanup_cache()
     
+    style, style_key, caption_font = None, "", ""
+    if style_id:
+        preset = get_style_preset(style_id)
+        definition = preset["definition"]
+        style, style_key, caption_font = preset["compiled"], preset["digest"], definition["caption_font"]
+        module_style, gradient_type = definition["module_style"], definition["gradient_type"]
+        start_color, end_color, bg_color = definition["start_color"], definition["end_color"], definition["bg_color"]
+        file = file or definition["file"]
+        logo_id = logo_id or definition["logo_id"]
+    file = str(file or "png")
+    
     # Générer la clé de cache
     cache_key = get_cache_key(data, file, size, body_color, bg_color, transparent,
-                             module_style, gradient_type, start_color, end_color, caption, logo_url)
+                             module_style, gradient_type, start_color, end_color, caption, logo_url,
+                             error_correction, logo_id, style_key)
     
-    # Vérifier le cache
+    # Vérifier le cache (et l'instantané restauré au démarrage, lu à la demande)
+    if cache_key not in QR_CACHE:
+        CACHE_SNAPSHOT.promote(cache_key)
     if cache_key in QR_CACHE:
+        CACHE_STATS["hits"] += 1
+        CACHE_HITS[cache_key] += 1
         cached_data, _ = QR_CACHE[cache_key]
         buf = io.BytesIO(cached_data)
         buf.seek(0)
+        timings = REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings.append(("cache", "hit"))
         return StreamingResponse(buf, media_type=f"image/{file.lower()}")
     
+    CACHE_STATS["misses"] += 1
+    RENDER_STATS["in_progress"] += 1
+    try:
+        return await _render_qr_uncached(
+            cache_key, data, file, size, body_color, bg_color, transparent, module_style,
+            gradient_type, start_color, end_color, caption, logo_url, logo_img, error_correction, logo_id,
+            style, caption_font
+        )
+    finally:
+        RENDER_STATS["in_progress"] -= 1
+
+async def _render_qr_uncached(
+    cache_key: str,
+    data: str,
+    file: str,
+    size: int,
+    body_color: str,
+    bg_color: str,
+    transparent: bool,
+    module_style: str,
+    gradient_type: str,
+    start_color: str,
+    end_color: str,
+    caption: str,
+    logo_url: str,
+    logo_img: Optional[Image.Image],
+    error_correction: str,
+    logo_id: str = "",
+    style: Optional[CompiledStyle] = None,
+    caption_font: str = ""
+) -> StreamingResponse:
+    """Rendu complet d'un QR code absent du cache, étape par étape."""
     # Normaliser les paramètres
     file = str(file or "png")
     size = int(size or 400)
@@ -160,164 +1465,224 @@ async def generate_qr_core(
     end_color = str(end_color or "#FFFFFF")
     caption = str(caption or "")
     logo_url = str(logo_url or "")
+    error_correction = str(error_correction or "auto")
     
     # Force white background if transparent, and force webp if file is not png or webp
     if transparent:
         bg_color = "#FFFFFF"
+        if style is not None:
+            style = style.on_background((255, 255, 255))
         if file.lower() not in ["png", "webp"]:
             file = "webp"
     
-    # Toujours passer un fond RGB à la génération du QR code
-    back = safe_hex_to_rgb(bg_color)
+    # Refuser les requêtes trop coûteuses avant tout téléchargement
+    cost = estimate_render_cost(size, module_style, gradient_type, transparent)
+    if logo_id:
+        logo_id = LOGOS.check(logo_id)
+    has_logo = logo_img is not None or bool(logo_url) or bool(logo_id)
     
-    # Créer le QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
+    # Ajouter le logo (uploadé ou distant)
+    if logo_img is None and not logo_id and logo_url:
+        with stage("logo_fetch"):
+            logo_img = await fetch_logo(logo_url, int(size * 0.2))
     
-    # Configurer le style et les couleurs
-    module_drawer = MODULE_STYLES.get(str(module_style), SquareModuleDrawer())
-    color_mask_cls = GRADIENTS.get(str(gradient_type), SolidFillColorMask)
-    front = safe_hex_to_rgb(start_color)
+    # Le rendu (CPU) s'exécute hors de la boucle d'événements, dans la limite du budget de pixels
+    async with render_slot(cost):
+        content, media_type = await run_in_threadpool(
+            render_qr_bytes, data, file, size, bg_color, transparent, module_style,
+            gradient_type, start_color, caption, logo_img, error_correction, has_logo, logo_id,
+            style, caption_font
+        )
     
-    if gradient_type == "solid":
-        color_mask = color_mask_cls(front_color=front, back_color=back)
-    elif gradient_type == "radial":
-        color_mask = color_mask_cls()
-        color_mask.center_color = front
-        color_mask.edge_color = back
-    elif gradient_type == "horizontal":
-        color_mask = color_mask_cls()
-        color_mask.left_color = front
-        color_mask.right_color = back
-    elif gradient_type == "vertical":
-        color_mask = color_mask_cls()
-        color_mask.top_color = front
-        color_mask.bottom_color = back
-    else:
-        color_mask = SolidFillColorMask(front_color=front, back_color=back)
+    if file.lower() not in ("svg", "pdf", "webp"):
+        # Mettre en cache le résultat
+        QR_CACHE[cache_key] = (content, datetime.utcnow())
+    return StreamingResponse(io.BytesIO(content), media_type=media_type)
+
+def make_transparent(img: Image.Image, threshold: int = 180) -> Image.Image:
+    """Rend transparents les pixels clairs (luminance > threshold), sans boucle Python."""
+    # La conversion en "L" utilise les mêmes coefficients de luminance (0.299, 0.587, 0.114)
+    light = img.convert("L").point(lambda v: 255 if v > threshold else 0)
+    img.paste((255, 255, 255, 0), mask=light)
+    return img
+
+@profiled
+def render_qr_bytes(
+    data: str,
+    file: str = "png",
+    size: int = 400,
+    bg_color: str = "#FFFFFF",
+    transparent: bool = False,
+    module_style: str = "square",
+    gradient_type: str = "solid",
+    start_color: str = "#000000",
+    caption: str = "",
+    logo_img: Optional[Image.Image] = None,
+    error_correction: str = "auto",
+    has_logo: bool = False,
+    logo_id: str = "",
+    style: Optional[CompiledStyle] = None,
+    caption_font: str = ""
+) -> tuple:
+    """
+    Rendu synchrone d'un QR code (paramètres déjà normalisés).
+    Retourne (contenu, media_type) ; appelé dans un thread par generate_qr_core.
+    """
+    if style is None:
+        style = compile_request_style(str(module_style), str(gradient_type), str(start_color), str(bg_color))
     
-    # Générer l'image
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=module_drawer,
-        color_mask=color_mask
-    ).convert("RGBA")
-    img = img.resize((int(size), int(size)), resample=Image.NEAREST)
+    # Créer le QR code
+    with stage("encode"):
+        qr = make_qr(data, error_correction, has_logo=has_logo or logo_img is not None)
     
-    # Ajouter le logo (uploadé ou distant)
-    if logo_img is None and logo_url:
-        try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(logo_url)
-                resp.raise_for_status()
-                logo_img = Image.open(io.BytesIO(resp.content)).convert("RGBA")
-        except Exception:
-            logo_img = None
+    with stage("draw"):
+        img = style.render(qr, int(size))
     
-    if logo_img:
-        logo_size = int(int(size) * 0.2)
-        logo_img = logo_img.resize((logo_size, logo_size))
-        pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
-        img.paste(logo_img, pos, mask=logo_img)
+    if logo_img or logo_id:
+        with stage("logo"):
+            logo_size = int(int(size) * 0.2)
+            if logo_img is None:
+                # Variante pré-décodée et pré-redimensionnée du registre
+                logo_img = LOGOS.variant(logo_id, logo_size)
+            elif logo_img.size != (logo_size, logo_size):
+                logo_img = logo_img.resize((logo_size, logo_size))
+            pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
+            img.paste(logo_img, pos, mask=logo_img)
     
     # Ajouter la légende
     if caption:
-        img = add_caption(img, caption, int(size))
+        with stage("caption"):
+            img = add_caption(img, caption, int(size), font=caption_font)
     
     # Rendre transparent si demandé
     if transparent:
-        datas = img.getdata()
-        newData = []
-        for item in datas:
-            # Utilise la luminance pour détecter tous les pixels clairs
-            luminance = 0.299 * item[0] + 0.587 * item[1] + 0.114 * item[2]
-            if luminance > 180:
-                newData.append((255, 255, 255, 0))
-            else:
-                newData.append(item)
-        img.putdata(newData)
+        with stage("alpha"):
+            img = make_transparent(img)
     
     # Sauvegarder dans le buffer
     buf = io.BytesIO()
     file_str = str(file or "png").lower()
     
-    if file_str == "svg":
-        qr_svg = qrcode.make(data, image_factory=SvgImage)
-        qr_svg.save(buf)
-        buf.seek(0)
-        return StreamingResponse(buf, media_type="image/svg+xml")
-    elif file_str == "pdf":
-        img.save(buf, format="PDF")
-        buf.seek(0)
-        return StreamingResponse(buf, media_type="application/pdf")
-    elif file_str == "webp":
-        img.save(buf, format="WEBP")
-        buf.seek(0)
-        return StreamingResponse(buf, media_type="image/webp")
-    else:
-        img.save(buf, format=file_str.upper())
-        buf.seek(0)
-        
-        # Mettre en cache le résultat
-        QR_CACHE[cache_key] = (buf.getvalue(), datetime.utcnow())
-        
-        buf.seek(0)
-        return StreamingResponse(buf, media_type=f"image/{file_str}")
+    with stage("encode_bytes"):
+        if file_str == "svg":
+            from qrcode.image.svg import SvgImage
+            qr_svg = qr.make_image(image_factory=SvgImage)
+            qr_svg.save(buf)
+            media_type = "image/svg+xml"
+        elif file_str == "pdf":
+            img.save(buf, format="PDF")
+            media_type = "application/pdf"
+        elif file_str == "webp":
+            img.save(buf, format="WEBP")
+            media_type = "image/webp"
+        else:
+            img.save(buf, format=file_str.upper())
+            media_type = f"image/{file_str}"
+    
+    return buf.getvalue(), media_type
 
 @app.post("/upload-image")
 async def upload_image(request: Request, file: UploadFile = File(...)):
+    """Enregistre un logo et renvoie son identifiant (logo_id) réutilisable par les endpoints de génération."""
     await verify_rapidapi_proxy(request)
-    content = await file.read()
-    return {"filename": file.filename, "content": content.hex()}
+    logo_id, size = await LOGOS.store_upload(file)
+    return {"filename": file.filename, "logo_id": logo_id, "size": size}
 
-@app.post("/create-custom-qr")
-async def create_custom_qr(
+@app.post("/styles")
+async def create_style(
     request: Request,
-    data: str = Form(...),
-    body_color: str = Form("#000000"),
+    style_id: str = Form(..., description="Name of the preset (letters, digits, - and _)."),
+    module_style: str = Form("square"),
+    gradient_type: str = Form("solid"),
+    start_color: str = Form("#000000"),
+    end_color: str = Form("#FFFFFF"),
     bg_color: str = Form("#FFFFFF"),
-    size: int = Form(600),
-    logo: Optional[UploadFile] = File(None),
+    eye_color: str = Form(""),
+    logo_id: str = Form(""),
+    caption_font: str = Form(""),
     file: str = Form("png")
 ):
+    """Enregistre (ou remplace) un style nommé, compilé une seule fois et réutilisable via style_id."""
     await verify_rapidapi_proxy(request)
-    body_color = str(body_color or "#000000")
-    bg_color = str(bg_color or "#FFFFFF")
-    file = str(file or "png")
-    size = int(size or 600)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    front_rgb = safe_hex_to_rgb(body_color)
-    back_rgb = safe_hex_to_rgb(bg_color)
+    return register_style(style_id, module_style, gradient_type, start_color, end_color, bg_color,
+                          eye_color, logo_id, caption_font, file)
+
+@app.get("/styles")
+async def list_styles(request: Request):
+    await verify_rapidapi_proxy(request)
+    tenant, _ = CURRENT_TENANT.get()
+    return {"styles": [preset["definition"] for (owner, _), preset in STYLE_PRESETS.items() if owner == tenant]}
+
+@app.get("/styles/{style_id}")
+async def get_style(request: Request, style_id: str):
+    await verify_rapidapi_proxy(request)
+    return get_style_preset(style_id)["definition"]
+
+@app.delete("/styles/{style_id}")
+async def delete_style(request: Request, style_id: str):
+    await verify_rapidapi_proxy(request)
+    get_style_preset(style_id)
+    del STYLE_PRESETS[(CURRENT_TENANT.get()[0], style_id)]
+    return {"deleted": style_id}
+
+def render_legacy_qr(data: str, error_correction: str, module_style: str, front: tuple, back: tuple,
+                     size: int, file: str, logo_source=None, clear_light: bool = False) -> io.BytesIO:
+    """
+    Rendu des endpoints historiques /create-custom-qr et /create-transparent-qr
+    (appel bloquant, à exécuter hors de la boucle d'événements).
+    """
+    from qrcode.image.styledpil import StyledPilImage
+    from qrcode.image.styles.colormasks import SolidFillColorMask
+    qr = make_qr(data, error_correction, has_logo=logo_source is not None)
     img = qr.make_image(
         image_factory=StyledPilImage,
-        module_drawer=RoundedModuleDrawer(),
-        color_mask=SolidFillColorMask(front_color=front_rgb, back_color=back_rgb)
+        module_drawer=type(MODULE_STYLES[module_style])(),
+        color_mask=SolidFillColorMask(front_color=front, back_color=back)
     ).convert("RGBA")
     img = img.resize((size, size))
-    if logo:
-        logo_bytes = await logo.read()
-        logo_img = Image.open(io.BytesIO(logo_bytes)).convert("RGBA")
+    if logo_source is not None:
         logo_size = int(size * 0.2)
-        logo_img = logo_img.resize((logo_size, logo_size))
+        logo_img = decode_logo(logo_source, logo_size)
         pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
         img.paste(logo_img, pos, mask=logo_img)
+    if clear_light:
+        img = clear_light_pixels(img)
     buf = io.BytesIO()
     img.save(buf, format=file.upper())
     buf.seek(0)
-    return StreamingResponse(buf, media_type=f"image/{file}")
+    return buf
+
+def clear_light_pixels(img: Image.Image, threshold: int = 220) -> Image.Image:
+    """Rend transparents les pixels dont les trois canaux dépassent threshold, sans boucle Python."""
+    from PIL import ImageChops
+    r, g, b, _ = img.split()
+    light = [band.point(lambda v: 255 if v > threshold else 0) for band in (r, g, b)]
+    mask = ImageChops.darker(ImageChops.darker(light[0], light[1]), light[2])
+    img.paste((255, 255, 255, 0), mask=mask)
+    return img
+
+@app.post("/create-custom-qr")
+async def create_custom_qr(
+    request: Request,
+    data: str = Form(...),
+    body_color: str = Form("#000000"),
+    bg_color: str = Form("#FFFFFF"),
+    size: int = Form(600),
+    logo: Optional[UploadFile] = File(None),
+    file: str = Form("png"),
+    error_correction: str = Form("auto")
+):
+    await verify_rapidapi_proxy(request)
+    body_color = str(body_color or "#000000")
+    bg_color = str(bg_color or "#FFFFFF")
+    file = str(file or "png")
+    size = int(size or 600)
+    async with render_slot(estimate_render_cost(size, "rounded")):
+        buf = await run_in_threadpool(
+            render_legacy_qr, data, error_correction, "rounded", safe_hex_to_rgb(body_color),
+            safe_hex_to_rgb(bg_color), size, file, logo.file if logo else None,
+        )
+        return StreamingResponse(buf, media_type=f"image/{file}")
 
 @app.get("/create-custom-qr")
 async def get_custom_qr(
@@ -327,33 +1692,20 @@ async def get_custom_qr(
     bg_color: str = Query("#FFFFFF"),
     size: int = Query(600),
     file: str = Query("png"),
-    logo: Optional[str] = Query(None)
+    logo: Optional[str] = Query(None),
+    error_correction: str = Query("auto")
 ):
     await verify_rapidapi_proxy(request)
     body_color = str(body_color or "#000000")
     bg_color = str(bg_color or "#FFFFFF")
     file = str(file or "png")
     size = int(size or 600)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    front_rgb = safe_hex_to_rgb(body_color)
-    back_rgb = safe_hex_to_rgb(bg_color)
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=RoundedModuleDrawer(),
-        color_mask=SolidFillColorMask(front_color=front_rgb, back_color=back_rgb)
-    ).convert("RGBA")
-    img = img.resize((size, size))
-    buf = io.BytesIO()
-    img.save(buf, format=file.upper())
-    buf.seek(0)
-    return StreamingResponse(buf, media_type=f"image/{file}")
+    async with render_slot(estimate_render_cost(size, "rounded")):
+        buf = await run_in_threadpool(
+            render_legacy_qr, data, error_correction, "rounded", safe_hex_to_rgb(body_color),
+            safe_hex_to_rgb(bg_color), size, file,
+        )
+        return StreamingResponse(buf, media_type=f"image/{file}")
 
 @app.post("/create-transparent-qr")
 async def create_transparent_qr(
@@ -361,46 +1713,18 @@ async def create_transparent_qr(
     data: str = Form(...),
     size: int = Form(400),
     file: str = Form("png"),
+    error_correction: str = Form("auto"),
     logo: Optional[UploadFile] = File(None)
 ):
     await verify_rapidapi_proxy(request)
     file = str(file or "png")
     size = int(size or 400)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    front_rgb = (0, 0, 0)
-    back_rgb = (255, 255, 255)
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=GappedSquareModuleDrawer(),
-        color_mask=SolidFillColorMask(front_color=front_rgb, back_color=back_rgb)
-    ).convert("RGBA")
-    img = img.resize((size, size))
-    if logo:
-        logo_bytes = await logo.read()
-        logo_img = Image.open(io.BytesIO(logo_bytes)).convert("RGBA")
-        logo_size = int(size * 0.2)
-        logo_img = logo_img.resize((logo_size, logo_size))
-        pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
-        img.paste(logo_img, pos, mask=logo_img)
-    datas = img.getdata()
-    newData = []
-    for item in datas:
-        if item[0] > 220 and item[1] > 220 and item[2] > 220:
-            newData.append((255, 255, 255, 0))
-        else:
-            newData.append(item)
-    img.putdata(newData)
-    buf = io.BytesIO()
-    img.save(buf, format=file.upper())
-    buf.seek(0)
-    return StreamingResponse(buf, media_type=f"image/{file}")
+    async with render_slot(estimate_render_cost(size, "gapped", transparent=True)):
+        buf = await run_in_threadpool(
+            render_legacy_qr, data, error_correction, "gapped", (0, 0, 0), (255, 255, 255),
+            size, file, logo.file if logo else None, clear_light=True,
+        )
+        return StreamingResponse(buf, media_type=f"image/{file}")
 
 @app.get("/create-transparent-qr")
 async def get_transparent_qr(
@@ -408,31 +1732,47 @@ async def get_transparent_qr(
     data: str = Query(...),
     size: int = Query(400),
     file: str = Query("png"),
-    logo: Optional[str] = Query(None)
+    logo: Optional[str] = Query(None),
+    error_correction: str = Query("auto")
 ):
     await verify_rapidapi_proxy(request)
     file = str(file or "png")
     size = int(size or 400)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    front_rgb = (0, 0, 0)
-    back_rgb = (255, 255, 255)
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=GappedSquareModuleDrawer(),
-        color_mask=SolidFillColorMask(front_color=front_rgb, back_color=back_rgb)
-    ).convert("RGBA")
-    img = img.resize((size, size))
+    async with render_slot(estimate_render_cost(size, "gapped")):
+        buf = await run_in_threadpool(
+            render_legacy_qr, data, error_correction, "gapped", (0, 0, 0), (255, 255, 255), size, file,
+        )
+        return StreamingResponse(buf, media_type=f"image/{file}")
+
+def render_advanced_qr(data: str, error_correction: str, style: "CompiledStyle", size: int, file: str,
+                       caption: Optional[str], logo_id: str = "", logo_source=None) -> tuple:
+    """Rendu de /create-advanced-qr (appel bloquant, hors boucle) : (BytesIO, type MIME)."""
+    qr = make_qr(data, error_correction, has_logo=logo_source is not None or bool(logo_id))
     buf = io.BytesIO()
-    img.save(buf, format=file.upper())
+    if file == "svg":
+        from qrcode.image.svg import SvgImage
+        qr.make_image(image_factory=SvgImage).save(buf)
+        buf.seek(0)
+        return buf, "image/svg+xml"
+    img = style.render(qr, size)
+    if logo_id or logo_source is not None:
+        logo_size = int(size * 0.2)
+        logo_img = LOGOS.variant(logo_id, logo_size) if logo_id else decode_logo(logo_source, logo_size)
+        pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
+        img.paste(logo_img, pos, mask=logo_img)
+    if caption:
+        img = add_caption(img, caption, size)
+    if file == "pdf":
+        img.save(buf, format="PDF")
+        media_type = "application/pdf"
+    elif file == "webp":
+        img.save(buf, format="WEBP")
+        media_type = "image/webp"
+    else:
+        img.save(buf, format=file.upper())
+        media_type = f"image/{file}"
     buf.seek(0)
-    return StreamingResponse(buf, media_type=f"image/{file}")
+    return buf, media_type
 
 @app.post("/create-advanced-qr")
 async def create_advanced_qr(
@@ -442,79 +1782,61 @@ async def create_advanced_qr(
     gradient_type: str = Form("solid"),
     start_color: str = Form("#000000"),
     end_color: str = Form("#FFFFFF"),
-    eye_color: str = Form("#000000"),
+    eye_color: str = Form("", description="Color of the three finder patterns (hex); same as the modules when empty."),
     caption: Optional[str] = Form(None),
     size: int = Form(600),
     file: str = Form("png"),
     as_base64: bool = Form(False),
+    error_correction: str = Form("auto"),
+    logo_id: str = Form(""),
     logo: Optional[UploadFile] = File(None)
 ):
     await verify_rapidapi_proxy(request)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    module_drawer = MODULE_STYLES.get(str(module_style), SquareModuleDrawer())
-    color_mask_cls = GRADIENTS.get(str(gradient_type), SolidFillColorMask)
-    front = safe_hex_to_rgb(start_color)
-    back = safe_hex_to_rgb(end_color)
-    if gradient_type == "solid":
-        color_mask = color_mask_cls(front_color=front, back_color=back)
-    elif gradient_type == "radial":
-        color_mask = color_mask_cls()
-        color_mask.center_color = front
-        color_mask.edge_color = back
-    elif gradient_type == "horizontal":
-        color_mask = color_mask_cls()
-        color_mask.left_color = front
-        color_mask.right_color = back
-    elif gradient_type == "vertical":
-        color_mask = color_mask_cls()
-        color_mask.top_color = front
-        color_mask.bottom_color = back
-    else:
-        color_mask = SolidFillColorMask(front_color=front, back_color=back)
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=module_drawer,
-        color_mask=color_mask
-    ).convert("RGBA")
-    img = img.resize((size, size))
-    if logo:
-        logo_bytes = await logo.read()
-        logo_img = Image.open(io.BytesIO(logo_bytes)).convert("RGBA")
-        logo_size = int(size * 0.2)
-        logo_img = logo_img.resize((logo_size, logo_size))
-        pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
-        img.paste(logo_img, pos, mask=logo_img)
-    if caption:
-        img = add_caption(img, caption, size)
-    buf = io.BytesIO()
-    if file == "svg":
-        qr_svg = qrcode.make(data, image_factory=SvgImage)
-        qr_svg.save(buf)
-        buf.seek(0)
-        return StreamingResponse(buf, media_type="image/svg+xml")
-    elif file == "pdf":
-        img.save(buf, format="PDF")
-        buf.seek(0)
-        return StreamingResponse(buf, media_type="application/pdf")
-    elif file == "webp":
-        img.save(buf, format="WEBP")
-        buf.seek(0)
-        return StreamingResponse(buf, media_type="image/webp")
-    elif as_base64:
-        img.save(buf, format="PNG")
-        b64 = base64.b64encode(buf.getvalue()).decode()
-        return {"base64": b64}
-    else:
-        img.save(buf, format=file.upper())
-        buf.seek(0)
-        return StreamingResponse(buf, media_type=f"image/{file}")
+    async with render_slot(estimate_render_cost(size, module_style, gradient_type)):
+        if logo_id:
+            logo_id = LOGOS.check(logo_id)
+        if eye_color and not HEX_COLOR_PATTERN.match(eye_color):
+            raise HTTPException(status_code=400, detail=f"Couleur invalide : {eye_color} (format #RRGGBB).")
+        # end_color sert de fond en uni et de fin de dégradé, comme dans generate_qr_core
+        style = compile_request_style(str(module_style), str(gradient_type), start_color, end_color, eye_color)
+        # as_base64 renvoie un PNG encodé, sauf pour svg/pdf/webp (comportement historique)
+        to_base64 = as_base64 and file not in ("svg", "pdf", "webp")
+        buf, media_type = await run_in_threadpool(
+            render_advanced_qr, data, error_correction, style, size, "png" if to_base64 else file, caption,
+            logo_id, None if logo_id or not logo else logo.file,
+        )
+        if to_base64:
+            return {"base64": base64.b64encode(buf.getvalue()).decode()}
+        return StreamingResponse(buf, media_type=media_type)
+
+# --- AJOUT : Images des QR dynamiques régénérables ---
+def dynamic_redirect_url(qr_id: str) -> str:
+    return f"http://127.0.0.1:8000/redirect/{qr_id}"
+
+def dynamic_render_params(qr_id: str, qr_info: dict, size: Optional[int] = None, file: Optional[str] = None) -> dict:
+    """
+    Paramètres de generate_qr_core pour l'image d'un QR dynamique. Ils ne dépendent que de
+    l'identifiant (l'URL encodée ne change jamais) et du style enregistré, pas de target_url :
+    une mise à jour de la destination n'invalide ni le cache de rendu ni l'ETag.
+    """
+    style = qr_info.get("style", {})
+    end_color = style.get("end_color", "#FFFFFF")
+    return {
+        "data": dynamic_redirect_url(qr_id),
+        "file": str(file or style.get("file") or "png").lower(),
+        "size": int(size or style.get("size") or 600),
+        # end_color sert de fond en uni et de fin de dégradé, comme à la création
+        "bg_color": end_color,
+        "module_style": style.get("module_style", "square"),
+        "gradient_type": style.get("gradient_type", "solid"),
+        "start_color": style.get("start_color", "#000000"),
+        "end_color": end_color,
+        "error_correction": style.get("error_correction", "auto"),
+        "logo_id": style.get("logo_id", ""),
+    }
+
+def dynamic_etag(params: dict) -> str:
+    return '"' + hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest() + '"'
 
 @app.post("/create-dynamic-qr")
 async def create_dynamic_qr(
@@ -527,59 +1849,64 @@ async def create_dynamic_qr(
     end_color: str = Form("#FFFFFF"),
     size: int = Form(600),
     file: str = Form("png"),
+    error_correction: str = Form("auto"),
+    logo_id: str = Form(""),
     logo: Optional[UploadFile] = File(None)
 ):
     await verify_rapidapi_proxy(request)
+    if logo_id:
+        logo_id = LOGOS.check(logo_id)
+    elif logo is not None:
+        # Le logo rejoint le registre pour que l'image puisse être régénérée plus tard
+        logo_id, _ = await LOGOS.store_upload(logo)
     qr_id = str(uuid.uuid4())
     expire_at = datetime.utcnow() + timedelta(days=expire_in_days)
-    DYNAMIC_QR_DB[qr_id] = {"target_url": target_url, "expire_at": expire_at}
-    # Le QR code pointe vers /redirect/{qr_id}
-    redirect_url = f"http://127.0.0.1:8000/redirect/{qr_id}"
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(redirect_url)
-    qr.make(fit=True)
-    module_drawer = MODULE_STYLES.get(str(module_style), SquareModuleDrawer())
-    color_mask_cls = GRADIENTS.get(str(gradient_type), SolidFillColorMask)
-    front = safe_hex_to_rgb(start_color)
-    back = safe_hex_to_rgb(end_color)
-    if gradient_type == "solid":
-        color_mask = color_mask_cls(front_color=front, back_color=back)
-    elif gradient_type == "radial":
-        color_mask = color_mask_cls()
-        color_mask.center_color = front
-        color_mask.edge_color = back
-    elif gradient_type == "horizontal":
-        color_mask = color_mask_cls()
-        color_mask.left_color = front
-        color_mask.right_color = back
-    elif gradient_type == "vertical":
-        color_mask = color_mask_cls()
-        color_mask.top_color = front
-        color_mask.bottom_color = back
-    else:
-        color_mask = SolidFillColorMask(front_color=front, back_color=back)
-    img = qr.make_image(
-        image_factory=StyledPilImage,
-        module_drawer=module_drawer,
-        color_mask=color_mask
-    ).convert("RGBA")
-    img = img.resize((size, size))
-    if logo:
-        logo_bytes = await logo.read()
-        logo_img = Image.open(io.BytesIO(logo_bytes)).convert("RGBA")
-        logo_size = int(size * 0.2)
-        logo_img = logo_img.resize((logo_size, logo_size))
-        pos = ((img.size[0] - logo_size) // 2, (img.size[1] - logo_size) // 2)
-        img.paste(logo_img, pos, mask=logo_img)
-    buf = io.BytesIO()
-    img.save(buf, format=file.upper())
-    buf.seek(0)
-    return StreamingResponse(buf, media_type=f"image/{file}")
+    DYNAMIC_QR_DB[qr_id] = {
+        "target_url": target_url,
+        "expire_at": expire_at,
+        "style": {
+            "module_style": module_style, "gradient_type": gradient_type, "start_color": start_color,
+            "end_color": end_color, "size": size, "file": file, "error_correction": error_correction,
+            "logo_id": logo_id,
+        },
+    }
+    params = dynamic_render_params(qr_id, DYNAMIC_QR_DB[qr_id], size, file)
+    try:
+        response = await generate_qr_core(**params)
+    except HTTPException:
+        # Rendu refusé (taille, budget, file d'attente) : ne pas garder d'enregistrement orphelin
+        DYNAMIC_QR_DB.pop(qr_id, None)
+        raise
+    # L'identifiant permet ensuite de mettre à jour le QR code sans décoder l'image
+    response.headers["X-QR-ID"] = qr_id
+    response.headers["ETag"] = dynamic_etag(params)
+    return response
+
+@app.get("/dynamic-qr/{qr_id}/image")
+async def get_dynamic_qr_image(
+    request: Request,
+    qr_id: str,
+    size: Optional[int] = Query(None, description="Size in pixels (default: size given at creation)."),
+    file: Optional[str] = Query(None, description="png, svg, pdf or webp (default: format given at creation).")
+):
+    """Régénère l'image d'un QR dynamique depuis son enregistrement (cache de rendu + ETag)."""
+    await verify_rapidapi_proxy(request)
+    qr_info = DYNAMIC_QR_DB.get(qr_id)
+    if not qr_info:
+        return JSONResponse({"error": "QR code inconnu ou expiré."}, status_code=404)
+    if datetime.utcnow() > qr_info["expire_at"]:
+        return JSONResponse({"error": "Ce QR code a expiré."}, status_code=410)
+    if file and file.lower() not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format invalide : {', '.join(OUTPUT_FORMATS)}.")
+    params = dynamic_render_params(qr_id, qr_info, size, file)
+    etag = dynamic_etag(params)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    response = await generate_qr_core(**params)
+    response.headers.update(headers)
+    return response
 
 @app.get("/redirect/{qr_id}")
 async def redirect_dynamic_qr(request: Request, qr_id: str):
@@ -610,14 +1937,24 @@ async def accueil():
 
 @app.get("/ping", tags=["Healthcheck"])
 async def ping():
-    """Endpoint de healthcheck pour RapidAPI."""
+    """Endpoint de healthcheck pour RapidAPI (503 tant que le préchauffage du cache n'est pas terminé)."""
+    if READINESS["warming"]:
+        return JSONResponse({"status": "warming"}, status_code=503)
     return {"status": "ok"}
 
+@app.get("/metrics", tags=["Healthcheck"])
+async def metrics(request: Request):
+    """Métriques Prometheus (protégées par METRICS_TOKEN si défini)."""
+    token = os.environ.get("METRICS_TOKEN")
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Jeton de métriques invalide.")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/generate-qr")
 async def generate_qr_get(
     request: Request,
     data: str = Query(..., description="Text or URL to encode"),
-    file: str = Query("png"),
+    file: Optional[str] = Query(None, description="png, svg, pdf or webp (default: png, or the format of style_id)."),
     size: int = Query(400),
     body_color: str = Query("#000000"),
     bg_color: str = Query("#FFFFFF"),
@@ -627,21 +1964,25 @@ async def generate_qr_get(
     start_color: str = Query("#000000"),
     end_color: str = Query("#FFFFFF"),
     caption: str = Query("", description="Optional caption below the QR code."),
-    logo_url: str = Query("", description="URL of a logo image to embed (GET or POST).")
+    logo_url: str = Query("", description="URL of a logo image to embed (GET or POST)."),
+    error_correction: str = Query("auto", description="Error correction level: L, M, Q, H or auto (H only when a logo is embedded)."),
+    logo_id: str = Query("", description="Identifier of a logo stored with /upload-image."),
+    style_id: str = Query("", description="Named style registered with POST /styles (overrides style parameters).")
 ):
     """Endpoint GET pour générer un QR code. Utilise la fonction centrale refactorisée."""
     await verify_rapidapi_proxy(request)
     return await generate_qr_core(
         data=data, file=file, size=size, body_color=body_color, bg_color=bg_color,
         transparent=transparent, module_style=module_style, gradient_type=gradient_type,
-        start_color=start_color, end_color=end_color, caption=caption, logo_url=logo_url
+        start_color=start_color, end_color=end_color, caption=caption, logo_url=logo_url,
+        error_correction=error_correction, logo_id=logo_id, style_id=style_id
     )
 
 @app.post("/generate-qr")
 async def generate_qr_post(
     request: Request,
     data: str = Form(..., description="Text or URL to encode"),
-    file: str = Form("png"),
+    file: Optional[str] = Form(None, description="png, svg, pdf or webp (default: png, or the format of style_id)."),
     size: int = Form(400),
     body_color: str = Form("#000000"),
     bg_color: str = Form("#FFFFFF"),
@@ -652,24 +1993,389 @@ async def generate_qr_post(
     end_color: str = Form("#FFFFFF"),
     caption: str = Form("", description="Optional caption below the QR code."),
     logo_url: str = Form("", description="URL of a logo image to embed (GET or POST)."),
+    error_correction: str = Form("auto", description="Error correction level: L, M, Q, H or auto (H only when a logo is embedded)."),
+    logo_id: str = Form("", description="Identifier of a logo stored with /upload-image."),
+    style_id: str = Form("", description="Named style registered with POST /styles (overrides style parameters)."),
     logo: Optional[UploadFile] = File(None)
 ):
     """Endpoint POST pour générer un QR code. Utilise la fonction centrale refactorisée."""
     await verify_rapidapi_proxy(request)
     
-    # Traiter le logo uploadé si fourni
-    logo_img = None
+    # Le logo uploadé rejoint le registre : les envois suivants du même fichier réutilisent ses variantes
     if logo is not None:
-        logo_bytes = await logo.read()
-        logo_img = Image.open(io.BytesIO(logo_bytes)).convert("RGBA")
+        logo_id, _ = await LOGOS.store_upload(logo)
     
     return await generate_qr_core(
         data=data, file=file, size=size, body_color=body_color, bg_color=bg_color,
         transparent=transparent, module_style=module_style, gradient_type=gradient_type,
         start_color=start_color, end_color=end_color, caption=caption, logo_url=logo_url,
-        logo_img=logo_img
+        error_correction=error_correction, logo_id=logo_id, style_id=style_id
     )
 
+# --- AJOUT : Canal de génération en flux (WebSocket et NDJSON) ---
+# Les clients à haut débit envoient des tâches en continu ({"id": ..., "data": ..., ...}, mêmes
+# paramètres que generate_qr_core) et reçoivent les résultats étiquetés par id, dans l'ordre d'achèvement.
+QR_STREAM_MAX_IN_FLIGHT = int(os.environ.get("QR_STREAM_MAX_IN_FLIGHT", "8"))
+QR_STREAM_MAX_LINE_BYTES = int(os.environ.get("QR_STREAM_MAX_LINE_BYTES", str(64 * 1024)))
+STREAM_JOB_STR_FIELDS = (
+    "data", "file", "body_color", "bg_color", "module_style", "gradient_type", "start_color",
+    "end_color", "caption", "logo_url", "error_correction", "logo_id", "style_id",
+)
+STREAM_JOB_COLOR_FIELDS = ("body_color", "bg_color", "start_color", "end_color")
+STREAM_STATS = {"connections": 0}
+STREAM_JOBS = defaultdict(int)  # statut HTTP du résultat -> nombre de tâches
+
+def parse_job(spec) -> dict:
+    """Valide une tâche et retourne les paramètres de generate_qr_core (HTTPException 400 sinon)."""
+    if not isinstance(spec, dict):
+        raise HTTPException(status_code=400, detail="Tâche invalide : objet JSON attendu.")
+    unknown = set(spec) - set(STREAM_JOB_STR_FIELDS) - {"id", "size", "transparent"}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Paramètres inconnus : {', '.join(sorted(unknown))}.")
+    if not isinstance(spec.get("data"), str) or not spec["data"]:
+        raise HTTPException(status_code=400, detail="Le champ data est obligatoire.")
+    params = {}
+    for field in STREAM_JOB_STR_FIELDS:
+        if field in spec:
+            if not isinstance(spec[field], str):
+                raise HTTPException(status_code=400, detail=f"Le champ {field} doit être une chaîne.")
+            params[field] = spec[field]
+    for field in STREAM_JOB_COLOR_FIELDS:
+        if params.get(field) and not HEX_COLOR_PATTERN.match(params[field]):
+            raise HTTPException(status_code=400, detail=f"Couleur invalide : {params[field]} (format #RRGGBB).")
+    if "size" in spec:
+        if not isinstance(spec["size"], int) or isinstance(spec["size"], bool):
+            raise HTTPException(status_code=400, detail="Le champ size doit être un entier.")
+        params["size"] = spec["size"]
+    if "transparent" in spec:
+        params["transparent"] = bool(spec["transparent"])
+    return params
+
+async def render_job(spec) -> dict:
+    """Rend une tâche ; les erreurs deviennent un résultat (statut + message) au lieu de couper le flux."""
+    job_id = spec.get("id") if isinstance(spec, dict) else None
+    # Pas d'accumulation de Server-Timing sur une connexion qui dure
+    REQUEST_TIMINGS.set(None)
+    try:
+        response = await generate_qr_core(**parse_job(spec))
+        content = b"".join([chunk async for chunk in response.body_iterator])
+        result = {"id": job_id, "status": 200, "media_type": response.media_type,
+                  "data": base64.b64encode(content).decode()}
+    except HTTPException as exc:
+        result = {"id": job_id, "status": exc.status_code, "error": exc.detail}
+    except ValueError as exc:
+        # Paramètre refusé par qrcode ou Pillow (couleur, taille...) : erreur du client
+        result = {"id": job_id, "status": 400, "error": f"Paramètres invalides : {exc}"}
+    except Exception:
+        # Une tâche en échec ne doit ni couper le flux ni faire perdre les résultats des autres
+        result = {"id": job_id, "status": 500, "error": "Erreur interne pendant le rendu."}
+    STREAM_JOBS[result["status"]] += 1
+    return result
+
+async def run_job_stream(jobs, emit, max_in_flight: int = QR_STREAM_MAX_IN_FLIGHT):
+    """
+    Lit les tâches de l'itérateur asynchrone `jobs` et en rend au plus max_in_flight à la fois :
+    au-delà, la lecture s'arrête (contre-pression vers le client). Chaque résultat est passé
+    à `emit` dès qu'il est prêt. Les tâches en cours sont annulées si la connexion tombe.
+    """
+    slots = asyncio.Semaphore(max_in_flight)
+    emit_lock = asyncio.Lock()
+    tasks = set()
+
+    async def run(spec):
+        try:
+            result = await render_job(spec)
+            async with emit_lock:
+                await emit(result)
+        finally:
+            slots.release()
+
+    STREAM_STATS["connections"] += 1
+    try:
+        async for spec in jobs:
+            await slots.acquire()
+            task = asyncio.create_task(run(spec))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        STREAM_STATS["connections"] -= 1
+        for task in tasks:
+            task.cancel()
+
+def _parse_job_line(line):
+    try:
+        return json.loads(line)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+class JobStreamResponse(Response):
+    """
+    Réponse NDJSON full-duplex : les tâches sont lues ligne par ligne dans le corps de la requête
+    pendant que les résultats sont écrits, sans attendre la fin du corps.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, headers: Optional[dict] = None):
+        self.status_code = 200
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        async def jobs():
+            buffer = b""
+            discarding = False
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise ClientDisconnect()
+                buffer += message.get("body", b"")
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if discarding:
+                        # Fin d'une ligne trop longue déjà signalée
+                        discarding = False
+                    elif line.strip():
+                        yield _parse_job_line(line)
+                if len(buffer) > QR_STREAM_MAX_LINE_BYTES:
+                    yield None
+                    buffer, discarding = b"", True
+                if not message.get("more_body", False):
+                    if buffer.strip() and not discarding:
+                        yield _parse_job_line(buffer)
+                    return
+
+        async def emit(result):
+            line = json.dumps(result).encode() + b"\n"
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        try:
+            await run_job_stream(jobs(), emit)
+        except (ClientDisconnect, OSError):
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+@app.post("/generate-qr/stream")
+async def generate_qr_stream(request: Request):
+    """Flux NDJSON : une tâche JSON par ligne en entrée, un résultat JSON par ligne en sortie."""
+    await verify_rapidapi_proxy(request)
+    return JobStreamResponse()
+
+@app.websocket("/generate-qr/ws")
+async def generate_qr_websocket(websocket: WebSocket):
+    """WebSocket : un message texte JSON par tâche, un message JSON par résultat."""
+    try:
+        await verify_rapidapi_proxy(websocket)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def jobs():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            yield _parse_job_line(message.get("text") or message.get("bytes") or b"")
+
+    try:
+        await run_job_stream(jobs(), websocket.send_json)
+    except WebSocketDisconnect:
+        pass
+
+# --- AJOUT : Instantané du cache et préchauffage au démarrage ---
+# QR_CACHE_SNAPSHOT : fichier où les entrées les plus demandées sont enregistrées à l'arrêt
+# (et toutes les QR_CACHE_SNAPSHOT_INTERVAL secondes), puis relues à la demande au démarrage.
+# QR_WARMUP_FILE : JSONL de rendus (paramètres de generate_qr_core, "tenant" facultatif) ou
+# de styles ({"tenant": ..., "style": {paramètres de POST /styles}}) à préparer avant d'être prêt.
+QR_CACHE_SNAPSHOT = os.environ.get("QR_CACHE_SNAPSHOT", "")
+QR_CACHE_SNAPSHOT_INTERVAL = float(os.environ.get("QR_CACHE_SNAPSHOT_INTERVAL", "300"))
+QR_CACHE_SNAPSHOT_ENTRIES = int(os.environ.get("QR_CACHE_SNAPSHOT_ENTRIES", str(CACHE_MAX_SIZE)))
+QR_WARMUP_FILE = os.environ.get("QR_WARMUP_FILE", "")
+
+SNAPSHOT_MAGIC = b"QRCS\x01"
+SNAPSHOT_ENTRY = struct.Struct("<16sdII")  # empreinte MD5, date de création (s), hits, longueur
+SNAPSHOT_EPOCH = datetime(1970, 1, 1)
+READINESS = {"warming": False}
+WARMUP_STATS = {"rendered": 0, "styles": 0, "errors": 0}
+_background_tasks = set()
+
+class CacheSnapshot:
+    """
+    Instantané restauré par mmap : seul l'index (clé -> position) est lu au démarrage ;
+    une entrée n'est copiée dans QR_CACHE qu'à sa première demande.
+    """
+
+    def __init__(self):
+        self.index = {}  # clé -> (position, longueur, création, hits)
+        self.mm = None
+
+    def open(self, path: str) -> int:
+        try:
+            with open(path, "rb") as f:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Absent ou vide : démarrage à froid
+            return 0
+        if self.mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            return 0
+        expiry = datetime.utcnow() - timedelta(hours=CACHE_EXPIRY_HOURS)
+        position = len(SNAPSHOT_MAGIC)
+        while position + SNAPSHOT_ENTRY.size <= len(self.mm):
+            digest, created, hits, length = SNAPSHOT_ENTRY.unpack_from(self.mm, position)
+            position += SNAPSHOT_ENTRY.size
+            if position + length > len(self.mm):
+                break  # fichier tronqué : garder les entrées complètes
+            created = SNAPSHOT_EPOCH + timedelta(seconds=created)
+            if created > expiry:
+                self.index[digest.hex()] = (position, length, created, hits)
+            position += length
+        return len(self.index)
+
+    def promote(self, key: str):
+        entry = self.index.pop(key, None)
+        if entry is not None:
+            position, length, created, hits = entry
+            QR_CACHE[key] = (self.mm[position:position + length], created)
+            CACHE_HITS[key] = hits
+            CACHE_STATS["snapshot_restores"] += 1
+
+    def pending(self) -> list:
+        """Entrées pas encore demandées, à reporter dans le prochain instantané."""
+        view = memoryview(self.mm) if self.mm is not None else None
+        return [(key, view[position:position + length], created, hits)
+                for key, (position, length, created, hits) in self.index.items()]
+
+CACHE_SNAPSHOT = CacheSnapshot()
+
+def collect_snapshot_entries(limit: int) -> list:
+    """Les `limit` entrées les plus demandées (cache et instantané non encore relu), sur la boucle."""
+    expiry = datetime.utcnow() - timedelta(hours=CACHE_EXPIRY_HOURS)
+    entries = [(key, content, created, CACHE_HITS.get(key, 0)) for key, (content, created) in QR_CACHE.items()]
+    entries.extend(CACHE_SNAPSHOT.pending())
+    entries = [entry for entry in entries if entry[2] > expiry]
+    entries.sort(key=lambda entry: (entry[3], entry[2]), reverse=True)
+    return entries[:limit]
+
+def write_cache_snapshot(path: str, entries: list) -> int:
+    """Écrit l'instantané de façon atomique (fichier temporaire puis remplacement)."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        for key, content, created, hits in entries:
+            seconds = (created - SNAPSHOT_EPOCH).total_seconds()
+            f.write(SNAPSHOT_ENTRY.pack(bytes.fromhex(key), seconds, min(hits, 0xFFFFFFFF), len(content)))
+            f.write(content)
+    # L'ancien fichier reste lisible par le mmap ouvert jusqu'à la fin du processus
+    os.replace(tmp_path, path)
+    return len(entries)
+
+async def snapshot_cache() -> int:
+    if not QR_CACHE_SNAPSHOT:
+        return 0
+    entries = collect_snapshot_entries(QR_CACHE_SNAPSHOT_ENTRIES)
+    return await run_in_threadpool(write_cache_snapshot, QR_CACHE_SNAPSHOT, entries)
+
+async def periodic_snapshots():
+    while True:
+        await asyncio.sleep(QR_CACHE_SNAPSHOT_INTERVAL)
+        try:
+            await snapshot_cache()
+        except OSError:
+            pass  # disque plein ou indisponible : on réessaiera au prochain tour
+
+async def _warm_spec(spec: dict, slots: asyncio.Semaphore):
+    async with slots:
+        CURRENT_TENANT.set((str(spec.pop("tenant", "warmup")), str(spec.pop("plan", "BASIC")).upper()))
+        try:
+            response = await generate_qr_core(**parse_job(spec))
+            async for _ in response.body_iterator:
+                pass
+            WARMUP_STATS["rendered"] += 1
+        except Exception:
+            # Un rendu en échec ne doit pas interrompre le préchauffage des autres
+            WARMUP_STATS["errors"] += 1
+
+async def warm_up(path: str):
+    """Enregistre les styles puis pré-rend les codes de la liste ; /ping répond 503 pendant ce temps."""
+    READINESS["warming"] = True
+    try:
+        try:
+            with open(path) as f:
+                specs = [_parse_job_line(line) for line in f if line.strip()]
+        except OSError:
+            WARMUP_STATS["errors"] += 1
+            return
+        renders = []
+        for spec in specs:
+            if not isinstance(spec, dict):
+                WARMUP_STATS["errors"] += 1
+            elif "style" in spec:
+                token = CURRENT_TENANT.set((str(spec.get("tenant", "warmup")), "BASIC"))
+                try:
+                    register_style(**spec["style"])
+                    WARMUP_STATS["styles"] += 1
+                except (HTTPException, TypeError):
+                    WARMUP_STATS["errors"] += 1
+                finally:
+                    CURRENT_TENANT.reset(token)
+            else:
+                renders.append(spec)
+        slots = asyncio.Semaphore(QR_STREAM_MAX_IN_FLIGHT)
+        # Une tâche par rendu : chacune a son propre contexte (locataire)
+        await asyncio.gather(*(asyncio.create_task(_warm_spec(spec, slots)) for spec in renders))
+    finally:
+        READINESS["warming"] = False
+
+def _start_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def cache_startup():
+    if QR_CACHE_SNAPSHOT:
+        await run_in_threadpool(CACHE_SNAPSHOT.open, QR_CACHE_SNAPSHOT)
+        if QR_CACHE_SNAPSHOT_INTERVAL > 0:
+            _start_background(periodic_snapshots())
+    if QR_WARMUP_FILE:
+        READINESS["warming"] = True
+        _start_background(warm_up(QR_WARMUP_FILE))
+
+async def cache_shutdown():
+    for task in list(_background_tasks):
+        task.cancel()
+    try:
+        await snapshot_cache()
+    except OSError:
+        pass
+
+# --- AJOUT : Imports différés et préchargement du rendu ---
+# QR_PRELOAD_RENDERING : "startup" (défaut) charge qrcode, Pillow et httpx en arrière-plan
+# au démarrage du worker ; "import" les charge dès l'import de main (avant le fork avec
+# gunicorn --preload, les workers en héritent) ; "lazy" attend la première requête.
+QR_PRELOAD_RENDERING = os.environ.get("QR_PRELOAD_RENDERING", "startup").strip().lower()
+
+RENDERING_MODULES = (
+    "httpx", "qrcode", "qrcode.image.styledpil", "qrcode.image.styles.moduledrawers",
+    "qrcode.image.styles.colormasks", "qrcode.image.svg", "PIL.ImageDraw", "PIL.ImageFont", "PIL.ImageOps",
+)
+
+def preload_rendering():
+    """Importe les dépendances de rendu et instancie les registres de styles (idempotent)."""
+    for module in RENDERING_MODULES:
+        importlib.import_module(module)
+    for name in MODULE_STYLES:
+        MODULE_STYLES[name]
+    for name in GRADIENTS:
+        GRADIENTS[name]
+    eye_layer_drawer()
+
+if QR_PRELOAD_RENDERING == "import":
+    preload_rendering()
+
 if __name__ == "__main__":
     import os
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Contrôle d'admission par budget de pixels (AdmissionController) : rendu hors budget
+admis seul, réveil FIFO, course entre délai d'attente et attribution, annulation
+et refus 503 avec Retry-After.
+
+Usage :
+    python -m pytest -q test_admission.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import main
+
+
+async def settle():
+    """Laisse tourner les tâches prêtes de la boucle."""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_oversize_job_admitted_alone():
+    admission = main.AdmissionController(budget=100, timeout=5, max_queue=8)
+
+    async def scenario():
+        await admission.acquire(500)
+        assert admission.in_flight == 500
+        small = asyncio.create_task(admission.acquire(10))
+        await settle()
+        assert not small.done() and len(admission.waiters) == 1
+        admission.release(500)
+        await small
+        assert admission.in_flight == 10
+        admission.release(10)
+
+        # Hors budget derrière un petit rendu : attend que tout soit libéré
+        await admission.acquire(10)
+        big = asyncio.create_task(admission.acquire(500))
+        await settle()
+        assert not big.done()
+        admission.release(10)
+        await big
+        assert admission.in_flight == 500
+        admission.release(500)
+
+    asyncio.run(scenario())
+    assert admission.in_flight == 0 and not admission.waiters
+
+
+def test_fifo_wake_up_without_overtaking():
+    admission = main.AdmissionController(budget=100, timeout=5, max_queue=8)
+    granted = []
+
+    async def waiter(name, cost):
+        await admission.acquire(cost)
+        granted.append(name)
+
+    async def scenario():
+        await admission.acquire(50)
+        tasks = [asyncio.create_task(waiter("big", 80))]
+        await settle()
+        # "small" tiendrait dans le budget mais ne double pas la tête de file
+        tasks.append(asyncio.create_task(waiter("small", 10)))
+        tasks.append(asyncio.create_task(waiter("last", 50)))
+        await settle()
+        assert granted == [] and len(admission.waiters) == 3
+        admission.release(50)
+        await settle()
+        assert granted == ["big", "small"] and admission.in_flight == 90
+        admission.release(80)
+        await asyncio.gather(*tasks)
+        assert granted == ["big", "small", "last"] and admission.in_flight == 60
+
+    asyncio.run(scenario())
+
+
+def test_queue_full_and_timeout_are_503_with_retry_after():
+    admission = main.AdmissionController(budget=100, timeout=0.05, max_queue=1)
+
+    async def scenario():
+        await admission.acquire(100)
+        waiting = asyncio.create_task(admission.acquire(10))
+        await settle()
+        with pytest.raises(main.HTTPException) as full:
+            await admission.acquire(10)
+        with pytest.raises(main.HTTPException) as timeout:
+            await waiting
+        return full.value, timeout.value
+
+    full, timeout = asyncio.run(scenario())
+    for exc in (full, timeout):
+        assert exc.status_code == 503
+        assert exc.headers["Retry-After"] == str(main.QR_RETRY_AFTER)
+    assert admission.rejected == {"queue_full": 1, "timeout": 1}
+    assert admission.in_flight == 100 and not admission.waiters
+
+
+def test_grant_racing_timeout_keeps_the_slot(monkeypatch):
+    admission = main.AdmissionController(budget=100, timeout=5, max_queue=8)
+
+    async def wait_for(awaitable, timeout):
+        # Le rendu en cours se termine au moment même où le délai expire
+        admission.release(100)
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        await admission.acquire(100)
+        monkeypatch.setattr(main.asyncio, "wait_for", wait_for)
+        await admission.acquire(30)
+        monkeypatch.undo()
+
+    asyncio.run(scenario())
+    # Admis malgré le délai : le coût reste compté et rien n'est refusé
+    assert admission.in_flight == 30
+    assert not admission.waiters and not admission.rejected
+
+
+def test_cancellation_after_grant_releases_budget(monkeypatch):
+    admission = main.AdmissionController(budget=100, timeout=5, max_queue=8)
+
+    async def wait_for(awaitable, timeout):
+        # Le client se déconnecte juste après l'attribution du budget
+        admission.release(100)
+        raise asyncio.CancelledError
+
+    async def scenario():
+        await admission.acquire(100)
+        monkeypatch.setattr(main.asyncio, "wait_for", wait_for)
+        with pytest.raises(asyncio.CancelledError):
+            await admission.acquire(30)
+        monkeypatch.undo()
+
+    asyncio.run(scenario())
+    assert admission.in_flight == 0 and not admission.waiters
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    admission = main.AdmissionController(budget=100, timeout=5, max_queue=1)
+
+    async def scenario():
+        await admission.acquire(100)
+        waiting = asyncio.create_task(admission.acquire(10))
+        await settle()
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        # La place libérée dans la file sert aussitôt au suivant
+        assert not admission.waiters
+        follower = asyncio.create_task(admission.acquire(10))
+        await settle()
+        admission.release(100)
+        await follower
+
+    asyncio.run(scenario())
+    assert admission.in_flight == 10 and not admission.rejected
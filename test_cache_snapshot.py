@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Instantané du cache (format binaire QRCS), restauration paresseuse et préchauffage :
+écriture, troncature, réouverture, promotion à la demande et /ping pendant le préchauffage.
+
+Usage :
+    python -m pytest -q test_cache_snapshot.py
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+HEADERS = {"x-rapidapi-host": "test", "x-rapidapi-user": "snapshot"}
+
+
+def entry(name: str, content: bytes, hits: int, age_hours: float = 0) -> tuple:
+    created = datetime.utcnow() - timedelta(hours=age_hours)
+    return hashlib.md5(name.encode()).hexdigest(), content, created, hits
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(monkeypatch):
+    monkeypatch.setattr(main, "CACHE_SNAPSHOT", main.CacheSnapshot())
+    main.QR_CACHE.clear()
+    main.CACHE_HITS.clear()
+    yield
+    main.QR_CACHE.clear()
+    main.CACHE_HITS.clear()
+
+
+def test_round_trip_and_promote(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    entries = [entry("a", b"PNG-a" * 100, 7), entry("b", b"", 1), entry("c", b"\x00\xff" * 50, 3)]
+    assert main.write_cache_snapshot(path, entries) == 3
+
+    snapshot = main.CacheSnapshot()
+    assert snapshot.open(path) == 3
+    assert {key: (length, hits) for key, (_, length, _, hits) in snapshot.index.items()} == {
+        key: (len(content), hits) for key, content, _, hits in entries
+    }
+    # Rien n'est copié dans le cache avant la première demande
+    assert main.QR_CACHE == {}
+    restores = main.CACHE_STATS["snapshot_restores"]
+    key, content, _, hits = entries[0]
+    snapshot.promote(key)
+    assert main.QR_CACHE[key][0] == content and main.CACHE_HITS[key] == hits
+    assert key not in snapshot.index
+    assert main.CACHE_STATS["snapshot_restores"] == restores + 1
+    # Les entrées non demandées sont reportées dans l'instantané suivant
+    assert sorted(key for key, *_ in snapshot.pending()) == sorted(key for key, *_ in entries[1:])
+
+
+@pytest.mark.parametrize("cut", ["header", "content"])
+def test_truncated_file_keeps_complete_entries(tmp_path, cut):
+    path = str(tmp_path / "cache.snap")
+    entries = [entry("a", b"a" * 64, 1), entry("b", b"b" * 64, 1), entry("c", b"c" * 64, 1)]
+    main.write_cache_snapshot(path, entries)
+    size = os.path.getsize(path)
+    # Couper dans l'en-tête ou dans le contenu de la dernière entrée
+    keep = size - 64 - (main.SNAPSHOT_ENTRY.size // 2 if cut == "header" else -10)
+    with open(path, "r+b") as f:
+        f.truncate(keep)
+
+    snapshot = main.CacheSnapshot()
+    assert snapshot.open(path) == 2
+    for key, content, _, _ in entries[:2]:
+        snapshot.promote(key)
+        assert main.QR_CACHE[key][0] == content
+
+
+@pytest.mark.parametrize("payload", [b"", b"XXXX\x01garbage", b"QRCS\x02" + b"\x00" * 40])
+def test_missing_empty_or_foreign_file_starts_cold(tmp_path, payload):
+    path = tmp_path / "cache.snap"
+    path.write_bytes(payload)
+    assert main.CacheSnapshot().open(str(path)) == 0
+    assert main.CacheSnapshot().open(str(tmp_path / "absent.snap")) == 0
+
+
+def test_expired_entries_are_skipped(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    main.write_cache_snapshot(path, [entry("fresh", b"x", 1), entry("old", b"y", 1, main.CACHE_EXPIRY_HOURS + 1)])
+    snapshot = main.CacheSnapshot()
+    assert snapshot.open(path) == 1
+
+
+def test_restart_serves_snapshot_through_generate_qr(tmp_path):
+    path = str(tmp_path / "cache.snap")
+    client = TestClient(main.app)
+    params = {"data": "https://example.com/snapshot", "size": 200}
+    first = client.get("/generate-qr", params=params, headers=HEADERS)
+    assert first.status_code == 200
+    main.write_cache_snapshot(path, main.collect_snapshot_entries(10))
+
+    # « Redémarrage » : cache vide, instantané rouvert
+    main.QR_CACHE.clear()
+    main.CACHE_SNAPSHOT.open(path)
+    hits, restores = main.CACHE_STATS["hits"], main.CACHE_STATS["snapshot_restores"]
+    again = client.get("/generate-qr", params=params, headers=HEADERS)
+    assert again.content == first.content
+    assert main.CACHE_STATS["hits"] == hits + 1
+    assert main.CACHE_STATS["snapshot_restores"] == restores + 1
+
+
+def test_ping_gated_by_warm_up(tmp_path, monkeypatch):
+    warmup = tmp_path / "warmup.jsonl"
+    warmup.write_text("\n".join([
+        json.dumps({"tenant": "snapshot", "style": {"style_id": "warm", "module_style": "rounded"}}),
+        json.dumps({"tenant": "snapshot", "data": "https://example.com/warm", "style_id": "warm"}),
+        json.dumps({"data": "https://example.com/bad", "start_color": "#GG0000"}),
+        "pas du json",
+    ]) + "\n")
+    monkeypatch.setitem(main.WARMUP_STATS, "rendered", 0)
+    monkeypatch.setitem(main.WARMUP_STATS, "styles", 0)
+    monkeypatch.setitem(main.WARMUP_STATS, "errors", 0)
+    client = TestClient(main.app)
+
+    monkeypatch.setitem(main.READINESS, "warming", True)
+    r = client.get("/ping")
+    assert r.status_code == 503 and r.json()["status"] == "warming"
+
+    asyncio.run(main.warm_up(str(warmup)))
+    assert main.READINESS["warming"] is False
+    assert main.WARMUP_STATS == {"rendered": 1, "styles": 1, "errors": 2}
+    assert client.get("/ping").status_code == 200
+    assert len(main.QR_CACHE) == 1
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Images des QR dynamiques (GET /dynamic-qr/{qr_id}/image) : ETag et entrée de cache
+stables quand la destination change, 304 sur If-None-Match, 404/410 pour les codes
+inconnus ou expirés, et surcharge de size/file.
+
+Usage :
+    python -m pytest -q test_dynamic_image.py
+"""
+
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+
+HEADERS = {"x-rapidapi-host": "test", "x-rapidapi-user": "dynamic"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "DYNAMIC_QR_DB", {})
+    main.QR_CACHE.clear()
+    yield TestClient(main.app)
+    main.QR_CACHE.clear()
+
+
+def create(client, **fields) -> tuple:
+    r = client.post("/create-dynamic-qr", data={"target_url": "https://example.com/a", "size": 240, **fields}, headers=HEADERS)
+    assert r.status_code == 200
+    return r.headers["x-qr-id"], r
+
+
+def test_image_matches_creation_and_survives_url_update(client):
+    qr_id, created = create(client, start_color="#003366")
+    r = client.get(f"/dynamic-qr/{qr_id}/image", headers=HEADERS)
+    assert r.status_code == 200
+    assert r.content == created.content
+    assert r.headers["etag"] == created.headers["etag"]
+    assert r.headers["cache-control"] == "private, max-age=86400"
+
+    cached = set(main.QR_CACHE)
+    assert client.post("/update-dynamic-qr", data={"qr_id": qr_id, "new_url": "https://example.com/b"}, headers=HEADERS).status_code == 200
+    hits = main.CACHE_STATS["hits"]
+    again = client.get(f"/dynamic-qr/{qr_id}/image", headers=HEADERS)
+    # L'URL encodée (/redirect/{qr_id}) ne change pas : même ETag, même entrée de cache
+    assert again.headers["etag"] == r.headers["etag"] and again.content == r.content
+    assert set(main.QR_CACHE) == cached and main.CACHE_STATS["hits"] == hits + 1
+    assert client.get(f"/redirect/{qr_id}", headers=HEADERS, follow_redirects=False).headers["location"] == "https://example.com/b"
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", 'W/{etag}', '"autre", {etag}', "*"])
+def test_if_none_match_is_304(client, if_none_match):
+    qr_id, created = create(client)
+    etag = created.headers["etag"]
+    renders = main.CACHE_STATS["misses"]
+    r = client.get(f"/dynamic-qr/{qr_id}/image", headers={**HEADERS, "if-none-match": if_none_match.format(etag=etag)})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == etag
+    assert main.CACHE_STATS["misses"] == renders
+    assert client.get(f"/dynamic-qr/{qr_id}/image", headers={**HEADERS, "if-none-match": '"autre"'}).status_code == 200
+
+
+def test_unknown_and_expired(client):
+    assert client.get("/dynamic-qr/inconnu/image", headers=HEADERS).status_code == 404
+    qr_id, _ = create(client)
+    main.DYNAMIC_QR_DB[qr_id]["expire_at"] = datetime.utcnow() - timedelta(seconds=1)
+    assert client.get(f"/dynamic-qr/{qr_id}/image", headers=HEADERS).status_code == 410
+    # Une prolongation rend l'image à nouveau disponible
+    client.post("/update-dynamic-qr", data={"qr_id": qr_id, "new_url": "https://example.com/a", "extend_days": 1}, headers=HEADERS)
+    assert client.get(f"/dynamic-qr/{qr_id}/image", headers=HEADERS).status_code == 200
+
+
+def test_size_and_file_overrides(client):
+    qr_id, _ = create(client)
+    default = client.get(f"/dynamic-qr/{qr_id}/image", headers=HEADERS)
+    assert Image.open(io.BytesIO(default.content)).size == (240, 240)
+
+    bigger = client.get(f"/dynamic-qr/{qr_id}/image", params={"size": 320}, headers=HEADERS)
+    assert bigger.status_code == 200 and Image.open(io.BytesIO(bigger.content)).size == (320, 320)
+    assert bigger.headers["etag"] != default.headers["etag"]
+
+    svg = client.get(f"/dynamic-qr/{qr_id}/image", params={"file": "SVG"}, headers=HEADERS)
+    assert svg.status_code == 200 and svg.headers["content-type"].startswith("image/svg+xml")
+    assert svg.headers["etag"] not in (default.headers["etag"], bigger.headers["etag"])
+
+    assert client.get(f"/dynamic-qr/{qr_id}/image", params={"file": "gif"}, headers=HEADERS).status_code == 400
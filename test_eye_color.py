@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Couleur des motifs de position (eye_color) : les yeux prennent eye_color, les modules
+de données gardent start_color, et un rendu sans eye_color reste identique au pixel
+près au rendu d'origine (yeux dessinés module par module par qrcode).
+
+Usage :
+    python -m pytest -q test_eye_color.py
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, ImageChops, ImageOps
+from qrcode.image.styledpil import StyledPilImage
+
+import main
+
+HEADERS = {"x-rapidapi-host": "test", "x-rapidapi-user": "eyes"}
+DATA = "https://example.com/eyes"
+RED, BLUE, WHITE = (200, 0, 0), (0, 0, 200), (255, 255, 255)
+
+
+def reference_render(style, qr, size: int) -> Image.Image:
+    """Rendu d'avant les sprites : yeux dessinés par le dessinateur par défaut de qrcode."""
+    modules = qr.make_image(image_factory=StyledPilImage, module_drawer=type(main.MODULE_STYLES[style.module_style])())
+    mask = ImageOps.invert(modules.convert("L")).resize((size, size), resample=Image.NEAREST)
+    img = Image.new("RGBA", (size, size), (*style.back, 255))
+    if style.gradient_type == "solid":
+        img.paste((*style.front, 255), (0, 0, size, size), mask)
+    else:
+        img.paste(main.gradient_field(style.gradient_type, style.front, style.gradient_end, size), (0, 0), mask)
+    return img
+
+
+def native_size(qr) -> int:
+    return (qr.modules_count + 2 * qr.border) * qr.box_size
+
+
+def module_pixel(img, qr, row: int, col: int) -> tuple:
+    """Couleur au centre du module (ligne, colonne), à la taille native."""
+    x = (qr.border + col) * qr.box_size + qr.box_size // 2
+    y = (qr.border + row) * qr.box_size + qr.box_size // 2
+    return img.getpixel((x, y))[:3]
+
+
+def in_eye(qr, row: int, col: int) -> bool:
+    far = qr.modules_count - 7
+    return (row < 7 and (col < 7 or col >= far)) or (row >= far and col < 7)
+
+
+@pytest.mark.parametrize("module_style", ["square", "gapped", "circle", "rounded", "vertical", "horizontal"])
+@pytest.mark.parametrize("gradient_type", ["solid", "radial"])
+def test_without_eye_color_identical_to_reference(module_style, gradient_type):
+    qr = main.make_qr(DATA, "M")
+    style = main.compile_request_style(module_style, gradient_type, "#0000C8", "#FFFFFF")
+    for size in (native_size(qr), 300):
+        assert ImageChops.difference(style.render(qr, size), reference_render(style, qr, size)).getbbox() is None
+
+
+def test_eyes_take_eye_color_and_data_keeps_start_color():
+    qr = main.make_qr(DATA, "M")
+    style = main.compile_request_style("square", "solid", "#0000C8", "#FFFFFF", "#C80000")
+    img = style.render(qr, native_size(qr))
+    far = qr.modules_count - 7
+    for top, left in ((0, 0), (0, far), (far, 0)):
+        assert module_pixel(img, qr, top, left) == RED  # anneau
+        assert module_pixel(img, qr, top + 1, left + 1) == WHITE  # séparation
+        assert module_pixel(img, qr, top + 3, left + 3) == RED  # carré central
+    data_modules = [
+        module_pixel(img, qr, row, col)
+        for row in range(qr.modules_count) for col in range(qr.modules_count)
+        if not in_eye(qr, row, col) and qr.modules[row][col]
+    ]
+    assert data_modules and set(data_modules) == {BLUE}
+    assert {color for _, color in img.convert("RGB").getcolors()} == {RED, BLUE, WHITE}
+
+
+def test_create_advanced_qr_eye_color():
+    client = TestClient(main.app)
+    form = {"data": DATA, "size": 300, "start_color": "#0000C8"}
+    plain = client.post("/create-advanced-qr", data=form, headers=HEADERS)
+    colored = client.post("/create-advanced-qr", data={**form, "eye_color": "#C80000"}, headers=HEADERS)
+    assert plain.status_code == colored.status_code == 200
+    assert RED not in {color for _, color in Image.open(io.BytesIO(plain.content)).convert("RGB").getcolors()}
+    assert RED in {color for _, color in Image.open(io.BytesIO(colored.content)).convert("RGB").getcolors()}
+    assert client.post("/create-advanced-qr", data={**form, "eye_color": "red"}, headers=HEADERS).status_code == 400
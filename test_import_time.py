@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Budget de temps d'import de main.py (démarrage des workers).
+
+L'import doit se limiter à ce que /ping et /redirect utilisent : qrcode, httpx et
+les modules de dessin de Pillow sont chargés au premier rendu ou par preload_rendering().
+
+Usage :
+    python -m pytest -q test_import_time.py
+    QR_IMPORT_BUDGET_MS=150 python test_import_time.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Coût propre de main (FastAPI déjà importé), meilleur de IMPORT_RUNS imports à froid
+IMPORT_BUDGET_MS = float(os.environ.get("QR_IMPORT_BUDGET_MS", "250"))
+IMPORT_RUNS = int(os.environ.get("QR_IMPORT_RUNS", "3"))
+
+PROBE = """
+import json, sys, time
+import fastapi, PIL.Image
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({
+    "elapsed_ms": elapsed,
+    "loaded": [m for m in main.RENDERING_MODULES if m in sys.modules],
+}))
+"""
+
+
+def import_main() -> dict:
+    """Importe main dans un interpréteur neuf et retourne la durée et les modules de rendu chargés."""
+    env = dict(os.environ, QR_PRELOAD_RENDERING="lazy", PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_rendering_modules_not_imported():
+    assert import_main()["loaded"] == []
+
+
+def test_import_budget():
+    best = min(import_main()["elapsed_ms"] for _ in range(IMPORT_RUNS))
+    print(f"import main : {best:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    assert best <= IMPORT_BUDGET_MS, f"import main trop lent : {best:.1f} ms > {IMPORT_BUDGET_MS:.0f} ms"
+
+
+def test_standard_constants_match_qrcode():
+    """Les indicateurs recopiés de la norme doivent rester ceux de qrcode."""
+    sys.path.insert(0, ROOT)
+    import main
+    from qrcode import constants, util
+
+    assert main.ERROR_CORRECTION_LEVELS == {
+        "L": constants.ERROR_CORRECT_L, "M": constants.ERROR_CORRECT_M,
+        "Q": constants.ERROR_CORRECT_Q, "H": constants.ERROR_CORRECT_H,
+    }
+    assert main._SEGMENT_MODES == (util.MODE_NUMBER, util.MODE_ALPHA_NUM, util.MODE_8BIT_BYTE)
+    assert main._ALPHA_NUM_CHARS == frozenset(util.ALPHA_NUM)
+
+
+def test_preload_rendering():
+    sys.path.insert(0, ROOT)
+    import main
+
+    main.preload_rendering()
+    assert all(m in sys.modules for m in main.RENDERING_MODULES)
+    assert set(main.MODULE_STYLES) == set(main.MODULE_STYLES.loaded)
+
+
+if __name__ == "__main__":
+    for test in (test_rendering_modules_not_imported, test_import_budget,
+                 test_standard_constants_match_qrcode, test_preload_rendering):
+        test()
+        print(f"[OK] {test.__name__}")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Registre de logos : taille des uploads bornée avant l'analyse du formulaire,
+quota par locataire et budget disque des logos et de leurs variantes.
+
+Usage :
+    python -m pytest -q test_logos.py
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+
+HEADERS = {"x-rapidapi-host": "test", "x-rapidapi-user": "logos"}
+
+
+def png_bytes(color=(200, 30, 30), size=64) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class FakeUpload:
+    """Upload minimal (méthode read asynchrone) pour appeler store_upload hors HTTP."""
+
+    def __init__(self, content: bytes):
+        self.buffer = io.BytesIO(content)
+
+    async def read(self, size: int = -1) -> bytes:
+        return self.buffer.read(size)
+
+
+def store(registry, tenant: str, content: bytes) -> str:
+    token = main.CURRENT_TENANT.set((tenant, "BASIC"))
+    try:
+        return main.asyncio.run(registry.store_upload(FakeUpload(content)))[0]
+    finally:
+        main.CURRENT_TENANT.reset(token)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "LOGOS", main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 16))
+    return TestClient(main.app)
+
+
+def test_upload_within_limit(client):
+    r = client.post("/upload-image", files={"file": ("l.png", png_bytes(), "image/png")}, headers=HEADERS)
+    assert r.status_code == 200
+    assert main.LOGOS.check(r.json()["logo_id"])
+
+
+def test_oversized_content_length_rejected_before_parsing(client):
+    body = b"x" * (main.QR_MAX_FORM_BYTES + 1)
+    r = client.post("/upload-image", files={"file": ("big.png", body, "image/png")}, headers=HEADERS)
+    assert r.status_code == 413
+    assert os.listdir(main.LOGOS.directory) == []
+
+
+def test_oversized_chunked_body_rejected(client):
+    def chunks():
+        boundary = b"--limit"
+        yield boundary + b'\r\nContent-Disposition: form-data; name="file"; filename="big.png"\r\n'
+        yield b"Content-Type: image/png\r\n\r\n"
+        for _ in range(main.QR_MAX_FORM_BYTES // 65536 + 2):
+            yield b"x" * 65536
+        yield b"\r\n" + boundary + b"--\r\n"
+
+    r = client.post(
+        "/upload-image", content=chunks(),
+        headers={**HEADERS, "content-type": "multipart/form-data; boundary=limit"},
+    )
+    assert r.status_code == 413
+
+
+def test_tenant_quota_releases_oldest(tmp_path):
+    registry = main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 16, max_per_tenant=2)
+    first, second, third = (store(registry, "a", png_bytes((i, 0, 0))) for i in (1, 2, 3))
+    assert not os.path.exists(registry.path(first))
+    assert os.path.exists(registry.path(second)) and os.path.exists(registry.path(third))
+    with pytest.raises(main.HTTPException) as exc:
+        registry.check(first)
+    assert exc.value.status_code == 404
+
+
+def test_shared_logo_kept_while_owned(tmp_path):
+    registry = main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 16, max_per_tenant=1)
+    shared = store(registry, "a", png_bytes((9, 9, 9)))
+    store(registry, "b", png_bytes((9, 9, 9)))
+    store(registry, "a", png_bytes((8, 8, 8)))
+    # "a" a libéré le logo mais "b" le détient encore
+    assert os.path.exists(registry.path(shared))
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    logo = png_bytes(size=256)
+    registry = main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 0, disk_max_bytes=len(logo) * 4)
+    logo_id = store(registry, "a", logo)
+    for logo_size in range(60, 200, 10):
+        registry.variant(logo_id, logo_size)
+        registry.check(logo_id)  # l'original reste le plus récemment utilisé
+    assert registry.disk_bytes <= registry.disk_max_bytes
+    assert registry.disk_bytes == sum(os.path.getsize(path) for path in registry.files)
+    assert os.path.exists(registry.path(logo_id))
+    assert registry.evictions > 0
+    # Un registre neuf reconstruit l'index depuis le disque
+    reopened = main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 0, disk_max_bytes=len(logo) * 4)
+    reopened.check(logo_id)
+    assert reopened.disk_bytes == registry.disk_bytes
+
+
+@pytest.fixture
+def pinning_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "LOGOS", main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 0, max_per_tenant=1))
+    monkeypatch.setattr(main, "DYNAMIC_QR_DB", {})
+    monkeypatch.setattr(main, "STYLE_PRESETS", {})
+    main.QR_CACHE.clear()
+    return TestClient(main.app)
+
+
+def test_quota_keeps_logo_of_dynamic_qr(pinning_client):
+    r = pinning_client.post(
+        "/create-dynamic-qr", data={"target_url": "https://example.com/pinned", "size": 200},
+        files={"logo": ("l.png", png_bytes((1, 2, 3)), "image/png")}, headers=HEADERS,
+    )
+    assert r.status_code == 200
+    qr_id = r.headers["x-qr-id"]
+    logo_id = main.DYNAMIC_QR_DB[qr_id]["style"]["logo_id"]
+    # Le quota (1 logo) libère le logo du QR dynamique, mais il reste référencé
+    r = pinning_client.post("/upload-image", files={"file": ("n.png", png_bytes((4, 5, 6)), "image/png")}, headers=HEADERS)
+    assert r.status_code == 200
+    assert os.path.exists(main.LOGOS.path(logo_id))
+    main.QR_CACHE.clear()
+    assert pinning_client.get(f"/dynamic-qr/{qr_id}/image", params={"size": 240}, headers=HEADERS).status_code == 200
+
+
+def test_quota_keeps_logo_of_style(pinning_client):
+    logo_id = pinning_client.post(
+        "/upload-image", files={"file": ("l.png", png_bytes((7, 8, 9)), "image/png")}, headers=HEADERS,
+    ).json()["logo_id"]
+    assert pinning_client.post("/styles", data={"style_id": "brand", "logo_id": logo_id}, headers=HEADERS).status_code == 200
+    pinning_client.post("/upload-image", files={"file": ("n.png", png_bytes((9, 8, 7)), "image/png")}, headers=HEADERS)
+    assert os.path.exists(main.LOGOS.path(logo_id))
+    r = pinning_client.get("/generate-qr", params={"data": "https://example.com/brand", "style_id": "brand"}, headers=HEADERS)
+    assert r.status_code == 200
+
+
+def test_disk_budget_skips_referenced_logo(tmp_path, monkeypatch):
+    logo = png_bytes(size=256)
+    registry = main.LogoRegistry(str(tmp_path), main.LOGO_MAX_BYTES, 0, disk_max_bytes=len(logo) * 3)
+    pinned = store(registry, "a", logo)
+    monkeypatch.setattr(main, "DYNAMIC_QR_DB", {"qr": {"style": {"logo_id": pinned}}})
+    for i in range(1, 6):
+        store(registry, "a", png_bytes((i, 0, 0), size=256))
+    assert os.path.exists(registry.path(pinned))
+    assert registry.evictions > 0
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+File d'attente équitable par locataire (FairScheduler) : ordre WFQ, limites par
+locataire, annulation, délai d'attente et oubli des locataires inactifs.
+
+Usage :
+    python -m pytest -q test_scheduler.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import main
+
+
+async def run_jobs(scheduler, jobs, hold: float = 0.01):
+    """Lance les rendus (locataire, offre, coût) dans l'ordre et retourne l'ordre de démarrage."""
+    started = []
+
+    async def job(name, tenant, plan, cost):
+        async with scheduler.slot(tenant, plan, cost):
+            started.append(name)
+            await asyncio.sleep(hold)
+
+    tasks = []
+    for name, (tenant, plan, cost) in enumerate(jobs):
+        tasks.append(asyncio.create_task(job(name, tenant, plan, cost)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return started
+
+
+def test_light_tenant_overtakes_heavy_backlog():
+    scheduler = main.FairScheduler(concurrency=1, timeout=5, max_queue=32)
+    jobs = [("heavy", "BASIC", 100)] * 5 + [("light", "BASIC", 100)]
+    started = asyncio.run(run_jobs(scheduler, jobs))
+    # Le premier rendu de heavy part aussitôt ; light passe avant le reste de son arriéré
+    assert started.index(5) == 1
+    assert scheduler.tenants == {}
+
+
+def test_plan_weight_orders_equal_backlogs():
+    scheduler = main.FairScheduler(concurrency=1, timeout=5, max_queue=32)
+    jobs = [("first", "BASIC", 100)] + [("basic", "BASIC", 100)] * 3 + [("mega", "MEGA", 100)] * 3
+    started = asyncio.run(run_jobs(scheduler, jobs))
+    # MEGA (poids 8) termine son arriéré avant le deuxième rendu BASIC en attente
+    assert started[1:4] == [4, 5, 6]
+
+
+def test_tenant_concurrency_limit(monkeypatch):
+    monkeypatch.setitem(main.TENANT_CONCURRENCY, "capped", 2)
+    scheduler = main.FairScheduler(concurrency=8, timeout=5, max_queue=32)
+    peak = 0
+
+    async def scenario():
+        nonlocal peak
+
+        async def job():
+            nonlocal peak
+            async with scheduler.slot("capped", "BASIC", 10):
+                peak = max(peak, scheduler.tenants["capped"].running)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(job() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert scheduler.tenants == {}
+
+
+def test_cancelled_waiter_is_forgotten():
+    scheduler = main.FairScheduler(concurrency=1, timeout=5, max_queue=32)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("a", "BASIC", 10):
+                await release.wait()
+
+        async def waiter():
+            async with scheduler.slot("b", "BASIC", 10):
+                pass
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert scheduler.tenants["b"].queued == 1
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        assert "b" not in scheduler.tenants
+        release.set()
+        await first
+
+    asyncio.run(scenario())
+    assert scheduler.tenants == {} and scheduler.running == 0
+
+
+def test_timeout_and_full_queue():
+    scheduler = main.FairScheduler(concurrency=1, timeout=0.05, max_queue=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("a", "BASIC", 10):
+                await release.wait()
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.acquire("b", "BASIC", 10))
+        await asyncio.sleep(0)
+        with pytest.raises(main.HTTPException) as full:
+            await scheduler.acquire("b", "BASIC", 10)
+        assert full.value.status_code == 429
+        with pytest.raises(main.HTTPException) as timeout:
+            await waiting
+        assert timeout.value.status_code == 503
+        assert "b" not in scheduler.tenants
+        release.set()
+        await first
+
+    asyncio.run(scenario())
+    assert scheduler.tenants == {}
+
+
+def test_many_tenants_do_not_accumulate():
+    scheduler = main.FairScheduler(concurrency=4, timeout=5, max_queue=32)
+    jobs = [(f"user-{i}", "BASIC", 10) for i in range(200)]
+    asyncio.run(run_jobs(scheduler, jobs, hold=0))
+    assert scheduler.tenants == {}
+
+
+def test_metrics_labels_hide_tenant_ids(monkeypatch):
+    scheduler = main.FairScheduler(concurrency=1, timeout=5, max_queue=32)
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    assert scheduler._metrics_label("alice").startswith("t-")
+    assert "alice" not in scheduler._metrics_label("alice")
+    monkeypatch.setenv("METRICS_TOKEN", "secret")
+    assert scheduler._metrics_label("alice") == "alice"
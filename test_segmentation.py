@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Segmentation optimale et choix de version de make_qr.
+
+Usage :
+    python -m pytest -q test_segmentation.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+import qrcode
+from qrcode import util as qr_util
+
+import main
+
+ALPHABETS = ["0123456789", "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:", "abcdefgh/?=&é", "0123ABCD:/abc"]
+
+
+def random_payloads(count: int = 150, seed: int = 26):
+    rng = random.Random(seed)
+    for _ in range(count):
+        # Mélanges de plages homogènes pour exercer les changements de mode
+        parts = [
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 40)))
+            for alphabet in rng.choices(ALPHABETS, k=rng.randint(1, 6))
+        ]
+        yield "".join(parts)
+
+
+def qrcode_version(data: str, level: int) -> int:
+    """Version retenue par l'optimiseur de qrcode (add_data(optimize=20))."""
+    qr = qrcode.QRCode(version=None, error_correction=level)
+    qr.add_data(data, optimize=20)
+    qr.make(fit=True)
+    return qr.version
+
+
+@pytest.mark.parametrize("level_name", ["L", "M", "Q", "H"])
+def test_segments_round_trip_and_version(level_name):
+    level = main.ERROR_CORRECTION_LEVELS[level_name]
+    for data in random_payloads():
+        main.optimal_segments.cache_clear()
+        segments = main.optimal_segments(data, level)
+        assert b"".join(segment.data for segment in segments) == data.encode("utf-8")
+        for segment in segments:
+            # QRData(check_data=False) : le mode doit réellement convenir au contenu
+            assert qr_util.optimal_mode(segment.data) <= segment.mode
+        qr = main.make_qr(data, level_name)
+        assert qr.version <= qrcode_version(data, level), data
+
+
+def test_empty_data():
+    assert main.make_qr("").version == 1
+
+
+def test_data_overflow_is_413():
+    with pytest.raises(main.HTTPException) as exc:
+        main.make_qr("x" * 3000, "H")
+    assert exc.value.status_code == 413
+
+
+if __name__ == "__main__":
+    for level_name in ("L", "M", "Q", "H"):
+        test_segments_round_trip_and_version(level_name)
+    test_empty_data()
+    test_data_overflow_is_413()
+    print("[OK] segmentation")
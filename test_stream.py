@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Canaux de génération en flux (POST /generate-qr/stream et WebSocket /generate-qr/ws) :
+une tâche en échec produit un résultat d'erreur sans couper le flux ni perdre les autres.
+
+Usage :
+    python -m pytest -q test_stream.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+HEADERS = {"x-rapidapi-host": "test", "x-rapidapi-user": "stream"}
+BAD_JOBS = {
+    "color": ({"start_color": "#GG0000"}, 400),
+    "overflow": ({"data": "x" * 3000, "error_correction": "H"}, 413),
+    "crash": ({"data": "crash"}, 500),
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    core = main.generate_qr_core
+
+    async def generate_qr_core(**params):
+        if params.get("data") == "crash":
+            raise RuntimeError("panne simulée")
+        return await core(**params)
+
+    monkeypatch.setattr(main, "generate_qr_core", generate_qr_core)
+    return TestClient(main.app)
+
+
+def jobs_around(bad: dict) -> list:
+    return [
+        {"id": "before", "data": "https://example.com/before", "size": 128},
+        {"id": "bad", "data": "https://example.com/bad", "size": 128, **bad},
+        {"id": "after", "data": "https://example.com/after", "size": 128},
+    ]
+
+
+@pytest.mark.parametrize("name", sorted(BAD_JOBS))
+def test_ndjson_bad_job_between_good_ones(client, name):
+    bad, status = BAD_JOBS[name]
+    body = "\n".join(json.dumps(job) for job in jobs_around(bad)) + "\n"
+    r = client.post("/generate-qr/stream", content=body,
+                    headers={**HEADERS, "content-type": "application/x-ndjson"})
+    assert r.status_code == 200
+    results = {result["id"]: result for result in map(json.loads, r.text.splitlines())}
+    assert set(results) == {"before", "bad", "after"}
+    assert results["before"]["status"] == results["after"]["status"] == 200
+    assert results["bad"]["status"] == status and results["bad"]["error"]
+
+
+@pytest.mark.parametrize("name", sorted(BAD_JOBS))
+def test_websocket_bad_job_between_good_ones(client, name):
+    bad, status = BAD_JOBS[name]
+    with client.websocket_connect("/generate-qr/ws", headers=HEADERS) as ws:
+        for job in jobs_around(bad):
+            ws.send_text(json.dumps(job))
+        results = {}
+        for _ in range(3):
+            result = ws.receive_json()
+            results[result["id"]] = result
+    assert results["before"]["status"] == results["after"]["status"] == 200
+    assert results["bad"]["status"] == status and results["bad"]["error"]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Styles nommés (POST/GET/DELETE /styles) : enregistrement, validation, isolation
+entre locataires, limite par locataire et invalidation du cache quand un style
+est redéfini.
+
+Usage :
+    python -m pytest -q test_styles.py
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+
+ALICE = {"x-rapidapi-host": "test", "x-rapidapi-user": "alice"}
+BOB = {"x-rapidapi-host": "test", "x-rapidapi-user": "bob"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "STYLE_PRESETS", {})
+    main.QR_CACHE.clear()
+    yield TestClient(main.app)
+    main.QR_CACHE.clear()
+
+
+def dark_pixels(content: bytes) -> set:
+    """Couleurs des pixels non blancs d'un PNG."""
+    img = Image.open(io.BytesIO(content)).convert("RGB")
+    return {color for _, color in img.getcolors(1 << 16) if color != (255, 255, 255)}
+
+
+def test_register_list_get_delete(client):
+    r = client.post("/styles", data={"style_id": "brand", "module_style": "rounded", "start_color": "#112233"}, headers=ALICE)
+    assert r.status_code == 200
+    assert r.json()["module_style"] == "rounded" and r.json()["file"] == "png"
+    assert [style["style_id"] for style in client.get("/styles", headers=ALICE).json()["styles"]] == ["brand"]
+    assert client.get("/styles/brand", headers=ALICE).json()["start_color"] == "#112233"
+
+    r = client.get("/generate-qr", params={"data": "https://example.com/brand", "style_id": "brand"}, headers=ALICE)
+    assert r.status_code == 200 and r.headers["content-type"] == "image/png"
+
+    assert client.delete("/styles/brand", headers=ALICE).json() == {"deleted": "brand"}
+    assert client.get("/styles/brand", headers=ALICE).status_code == 404
+    r = client.get("/generate-qr", params={"data": "https://example.com/brand", "style_id": "brand"}, headers=ALICE)
+    assert r.status_code == 404
+
+
+@pytest.mark.parametrize("fields", [
+    {"style_id": "bad id!"},
+    {"style_id": "x" * 65},
+    {"style_id": "s", "module_style": "hexagon"},
+    {"style_id": "s", "gradient_type": "spiral"},
+    {"style_id": "s", "start_color": "red"},
+    {"style_id": "s", "eye_color": "#12345"},
+    {"style_id": "s", "file": "gif"},
+    {"style_id": "s", "caption_font": "inconnue"},
+])
+def test_invalid_definitions_are_400(client, fields):
+    r = client.post("/styles", data=fields, headers=ALICE)
+    assert r.status_code == 400
+    assert main.STYLE_PRESETS == {}
+
+
+def test_unknown_logo_is_404(client):
+    r = client.post("/styles", data={"style_id": "s", "logo_id": "0" * 64}, headers=ALICE)
+    assert r.status_code == 404
+
+
+def test_styles_are_isolated_per_tenant(client):
+    client.post("/styles", data={"style_id": "brand", "start_color": "#112233"}, headers=ALICE)
+    assert client.get("/styles", headers=BOB).json() == {"styles": []}
+    assert client.get("/styles/brand", headers=BOB).status_code == 404
+    assert client.delete("/styles/brand", headers=BOB).status_code == 404
+    r = client.get("/generate-qr", params={"data": "https://example.com/brand", "style_id": "brand"}, headers=BOB)
+    assert r.status_code == 404
+    # Le même nom chez un autre locataire est un style distinct
+    client.post("/styles", data={"style_id": "brand", "start_color": "#445566"}, headers=BOB)
+    assert client.get("/styles/brand", headers=ALICE).json()["start_color"] == "#112233"
+
+
+def test_per_tenant_limit_is_409(client, monkeypatch):
+    monkeypatch.setattr(main, "QR_MAX_STYLES_PER_TENANT", 2)
+    for style_id in ("one", "two"):
+        assert client.post("/styles", data={"style_id": style_id}, headers=ALICE).status_code == 200
+    assert client.post("/styles", data={"style_id": "three"}, headers=ALICE).status_code == 409
+    # Remplacer un style existant ne compte pas comme un nouveau style
+    assert client.post("/styles", data={"style_id": "two", "start_color": "#101010"}, headers=ALICE).status_code == 200
+    # La limite est propre à chaque locataire
+    assert client.post("/styles", data={"style_id": "three"}, headers=BOB).status_code == 200
+
+
+def test_redefined_style_is_not_served_from_cache(client):
+    params = {"data": "https://example.com/cache", "style_id": "brand", "size": 200}
+    client.post("/styles", data={"style_id": "brand", "start_color": "#CC0000"}, headers=ALICE)
+    red = client.get("/generate-qr", params=params, headers=ALICE)
+    assert dark_pixels(red.content) == {(204, 0, 0)}
+
+    client.post("/styles", data={"style_id": "brand", "start_color": "#0000CC"}, headers=ALICE)
+    hits = main.CACHE_STATS["hits"]
+    blue = client.get("/generate-qr", params=params, headers=ALICE)
+    assert dark_pixels(blue.content) == {(0, 0, 204)}
+    assert main.CACHE_STATS["hits"] == hits and len(main.QR_CACHE) == 2
+
+    # Une définition identique garde la même empreinte : le rendu en cache est réutilisé
+    client.post("/styles", data={"style_id": "brand", "start_color": "#0000CC"}, headers=ALICE)
+    again = client.get("/generate-qr", params=params, headers=ALICE)
+    assert again.content == blue.content and main.CACHE_STATS["hits"] == hits + 1